@@ -0,0 +1,142 @@
+"""
+Per-message latency of match_products at different catalog sizes.
+
+Runs fully offline: synthetic catalogs are seeded straight into the in-process
+catalog index, so no MongoDB is needed.
+
+    cd backend
+    python -m benchmarks.bench_matcher
+    python -m benchmarks.bench_matcher --sizes 50 500 5000 --messages 300
+
+Before timing, a fixed set of typo and look-alike cases is checked. The
+synthetic catalogs only hold the products a message asks for, so they cannot
+show a wrong match; these cases can ("tea" must never become Pea).
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from services import catalog_index, normalizer
+from services.ai_parser import match_products
+
+BRANDS = ["Amul", "Parle", "Britannia", "Tata", "Aashirvaad", "Haldiram", "Nestle", "Dabur", "Fortune", "Mother Dairy"]
+ITEMS = ["Milk", "Bread", "Eggs", "Rice", "Atta", "Sugar", "Salt", "Biscuits", "Butter", "Paneer",
+         "Curd", "Ghee", "Tea", "Coffee", "Namkeen", "Oil", "Dal", "Soap", "Shampoo", "Noodles"]
+VARIANTS = ["", "Small", "Large", "Family Pack", "Lite", "Gold", "Classic", "Premium"]
+# Look-alike products one letter away from a common order word; never a right answer
+DECOYS = ["Pea", "Foil", "Malt", "Silk Saree", "Dice Set", "Malt Drink", "Aluminium Foil"]
+
+
+def make_catalog(shop_id: str, size: int, rng: random.Random) -> catalog_index.CatalogIndex:
+    names = set()
+    while len(names) < size:
+        parts = [rng.choice(BRANDS), rng.choice(ITEMS), rng.choice(VARIANTS)]
+        if len(names) > len(BRANDS) * len(ITEMS) * len(VARIANTS) // 2:
+            parts.append(str(rng.randint(1, 10_000)))
+        names.add(" ".join(p for p in parts if p))
+    names.update(DECOYS)
+    products = [
+        {"_id": f"{shop_id}-{i}", "shop_id": shop_id, "name": name, "price": rng.randint(10, 500), "stock": 100}
+        for i, name in enumerate(sorted(names))
+    ]
+    return catalog_index.CatalogIndex(shop_id, products)
+
+
+# (catalog, item name, expected product or None); anything else is a wrong match
+ACCURACY_CASES = [
+    (["Pea", "Tata Tea Gold Premium"], "tea", "Tata Tea Gold Premium"),
+    (["Foil", "Fortune Mustard Oil 1L"], "oil", "Fortune Mustard Oil 1L"),
+    (["Malt", "Tata Salt Lite 1kg"], "salt", "Tata Salt Lite 1kg"),
+    (["Silk Saree"], "milk", None),
+    (["Dice Set"], "rice", None),
+    (["Malt Drink"], "salt", None),
+    (["Aluminium Foil"], "oil", None),
+    (["Pea"], "tea", None),
+    (["Britannia Bread", "Amul Milk"], "bred", "Britannia Bread"),
+    (["Tata Salt", "Malt"], "sallt", "Tata Salt"),
+    (["Amul Milk", "Silk Saree"], "miilk", "Amul Milk"),
+    (["Aashirvaad Atta", "Tata Salt"], "aashirvad atta", "Aashirvaad Atta"),
+]
+
+
+async def check_accuracy() -> int:
+    """Run ACCURACY_CASES through match_products; returns the number of wrong matches."""
+    wrong = missed = 0
+    for n, (names, query, expected) in enumerate(ACCURACY_CASES):
+        shop_id = f"bench-accuracy-{n}"
+        products = [{"_id": f"{shop_id}-{i}", "name": name, "price": 10, "stock": 10} for i, name in enumerate(names)]
+        catalog_index.cache_catalog(catalog_index.CatalogIndex(shop_id, products))
+        normalizer.cache_normalizer(shop_id, normalizer.GLOBAL_NORMALIZER)
+        [result] = await match_products([{"name": query, "quantity": 1}], shop_id)
+        got = result["matched_product_name"]
+        if got == expected:
+            continue
+        if got is None:
+            missed += 1
+        else:
+            wrong += 1
+        print(f"  {query!r}: expected {expected}, got {got} ({result['confidence']})")
+    print(f"accuracy cases: {len(ACCURACY_CASES)}, wrong matches: {wrong}, missed: {missed}\n")
+    return wrong
+
+
+def typo(word: str, rng: random.Random) -> str:
+    if len(word) < 4:
+        return word
+    i = rng.randrange(1, len(word) - 1)
+    return rng.choice([word[:i] + word[i + 1:], word[:i] + word[i] + word[i:]])
+
+
+def make_messages(count: int, rng: random.Random) -> list:
+    messages = []
+    for _ in range(count):
+        messages.append([
+            {"name": typo(rng.choice(ITEMS).lower(), rng), "quantity": rng.randint(1, 5)}
+            for _ in range(rng.randint(1, 4))
+        ])
+    return messages
+
+
+async def run(sizes, message_count, seed):
+    await check_accuracy()
+    rng = random.Random(seed)
+    messages = make_messages(message_count, rng)
+    print(f"{'products':>9} {'first ms':>9} {'p50 ms':>8} {'p99 ms':>8} {'msg/s':>8} {'matched':>8} {'decoy':>6}")
+    for size in sizes:
+        shop_id = f"bench-{size}"
+        catalog_index.cache_catalog(make_catalog(shop_id, size, rng))
+        normalizer.cache_normalizer(shop_id, normalizer.GLOBAL_NORMALIZER)
+
+        start = time.perf_counter()
+        await match_products(messages[0], shop_id)  # builds the trigram matrix
+        first = (time.perf_counter() - start) * 1000
+
+        latencies, matched, decoys, total = [], 0, 0, 0
+        for items in messages:
+            start = time.perf_counter()
+            result = await match_products(items, shop_id)
+            latencies.append((time.perf_counter() - start) * 1000)
+            matched += sum(1 for r in result if r["matched_product_id"])
+            decoys += sum(1 for r in result if r["matched_product_name"] in DECOYS)
+            total += len(result)
+
+        latencies.sort()
+        p50 = statistics.median(latencies)
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        rate = len(latencies) / (sum(latencies) / 1000)
+        print(f"{size:>9} {first:>9.2f} {p50:>8.3f} {p99:>8.3f} {rate:>8.0f} {matched / total:>8.0%} {decoys:>6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 500, 5000])
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    asyncio.run(run(args.sizes, args.messages, args.seed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Order-create load test: latency and throughput of POST /api/orders/ for
+orders of 1, 10 and 50 lines.
+
+Requests go through the FastAPI app in-process (httpx ASGI transport), so the
+numbers cover validation, the product fetch and the stock commit, but not
+network or uvicorn. Needs a running MongoDB; point it at a scratch database.
+The benchmark seeds its own shop and products and deletes them afterwards.
+
+    cd backend
+    DB_NAME=bazaarmind_bench python -m benchmarks.bench_orders
+    DB_NAME=bazaarmind_bench python -m benchmarks.bench_orders --lines 1 10 50 --orders 500 --concurrency 20
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import httpx
+from bson import ObjectId
+
+from benchmarks.bench_parser import percentile
+from database.connection import connect_db, close_db, get_db
+from main import app
+
+PRODUCTS = 50
+
+
+async def seed(rng: random.Random) -> tuple:
+    db = get_db()
+    now = time.time()
+    shop = await db.shops.insert_one({
+        "name": "Bench Kirana",
+        "shop_type": "kirana",
+        "phone": f"bench-{now}-{rng.random()}",
+        "whatsapp_number": "",
+        "active": True,
+    })
+    shop_id = str(shop.inserted_id)
+    result = await db.products.insert_many([
+        {"shop_id": shop_id, "name": f"Bench Product {i}", "price": 10 + i, "stock": 10 ** 9, "active": True}
+        for i in range(PRODUCTS)
+    ])
+    return shop_id, [str(pid) for pid in result.inserted_ids]
+
+
+async def cleanup(shop_id: str):
+    db = get_db()
+    await db.orders.delete_many({"shop_id": shop_id})
+    await db.products.delete_many({"shop_id": shop_id})
+    await db.shops.delete_one({"_id": ObjectId(shop_id)})
+
+
+def make_order(shop_id: str, product_ids: list, lines: int, rng: random.Random) -> dict:
+    items = []
+    for pid in rng.sample(product_ids, lines):
+        quantity = rng.randint(1, 3)
+        items.append({"product_id": pid, "product_name": "", "quantity": quantity,
+                      "unit_price": 10.0, "total": 10.0 * quantity})
+    return {"shop_id": shop_id, "customer_phone": "+910000000000", "items": items, "channel": "manual"}
+
+
+async def run_case(client: httpx.AsyncClient, shop_id: str, product_ids: list, lines: int, args, rng) -> dict:
+    orders = [make_order(shop_id, product_ids, lines, rng) for _ in range(args.orders)]
+    await client.post("/api/orders/", json=orders[0])  # warm up
+
+    latencies = []
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def one(order):
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.post("/api/orders/", json=order)
+            latencies.append((time.perf_counter() - start) * 1000)
+            response.raise_for_status()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(o) for o in orders))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "lines": lines,
+        "orders": len(orders),
+        "orders_per_sec": round(len(orders) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50), 2),
+        "p99_ms": round(percentile(latencies, 0.99), 2),
+    }
+
+
+async def run(args) -> list:
+    await connect_db()
+    rng = random.Random(args.seed)
+    shop_id, product_ids = await seed(rng)
+    rows = []
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for lines in args.lines:
+                rows.append(await run_case(client, shop_id, product_ids, lines, args, rng))
+    finally:
+        await cleanup(shop_id)
+        await close_db()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--orders", type=int, default=200, help="orders per line count")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+    if max(args.lines) > PRODUCTS:
+        parser.error(f"--lines cannot exceed {PRODUCTS}")
+
+    rows = asyncio.run(run(args))
+    print(f"{'lines':>6} {'orders':>7} {'orders/s':>9} {'p50 ms':>8} {'p99 ms':>8}")
+    for row in rows:
+        print(f"{row['lines']:>6} {row['orders']:>7} {row['orders_per_sec']:>9} {row['p50_ms']:>8} {row['p99_ms']:>8}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"params": {k: v for k, v in vars(args).items() if k != "output"}, "results": rows}, f, indent=2)
+        print(f"\nWrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Parser throughput and accuracy benchmark (offline).
+
+Runs parse_order over a generated Hindi / Hinglish / English corpus against
+synthetic catalogs of several sizes and shop types, with no MongoDB and no
+Gemini: catalogs are seeded into the in-process index and the LLM is left
+unconfigured, so "llm_fallback_rate" is the share of messages the rule-based
+parser could not handle on its own.
+
+Reported per (shop type, catalog size):
+  msgs_per_sec, p50_ms, p99_ms, llm_fallback_rate,
+  precision / recall (matched products vs expected base items), qty_accuracy
+
+    cd backend
+    python -m benchmarks.bench_parser --output bench.json
+    python -m benchmarks.bench_parser --baseline bench.json   # print deltas vs an earlier run
+"""
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import time
+from datetime import datetime
+
+from benchmarks import corpus
+from services import catalog_index, llm_gateway, normalizer
+from services.ai_parser import parse_order
+
+METRICS = ["msgs_per_sec", "p50_ms", "p99_ms", "llm_fallback_rate", "precision", "recall", "qty_accuracy"]
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * pct))]
+
+
+async def run_case(shop_type: str, size: int, messages, rng) -> dict:
+    shop_id = f"bench-{shop_type}-{size}"
+    products = corpus.make_catalog(shop_type, shop_id, size, rng)
+    base_of = {p["_id"]: p["base"] for p in products}
+    catalog_index.cache_catalog(catalog_index.CatalogIndex(shop_id, products))
+    normalizer.cache_normalizer(shop_id, normalizer.GLOBAL_NORMALIZER)
+
+    await parse_order(messages[0].text, shop_id)  # warm the trigram matrix
+
+    latencies = []
+    fallbacks = matched = correct = expected_total = qty_correct = 0
+    for message in messages:
+        start = time.perf_counter()
+        result = await parse_order(message.text, shop_id)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+        if not result["items"]:
+            fallbacks += 1
+        expected = {e["item"]: e["quantity"] for e in message.expected}
+        expected_total += len(expected)
+        seen = set()
+        for item in result["items"]:
+            if not item["matched_product_id"]:
+                continue
+            matched += 1
+            base = base_of[item["matched_product_id"]]
+            if base in expected and base not in seen:
+                seen.add(base)
+                correct += 1
+                qty_correct += item["quantity"] == expected[base]
+
+    latencies.sort()
+    return {
+        "shop_type": shop_type,
+        "catalog_size": size,
+        "messages": len(messages),
+        "msgs_per_sec": round(len(messages) / (sum(latencies) / 1000), 1),
+        "p50_ms": round(percentile(latencies, 0.50), 3),
+        "p99_ms": round(percentile(latencies, 0.99), 3),
+        "llm_fallback_rate": round(fallbacks / len(messages), 4),
+        "precision": round(correct / matched, 4) if matched else 0.0,
+        "recall": round(correct / expected_total, 4) if expected_total else 0.0,
+        "qty_accuracy": round(qty_correct / correct, 4) if correct else 0.0,
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+
+def print_table(rows, baseline=None):
+    base = {(r["shop_type"], r["catalog_size"]): r for r in (baseline or {}).get("results", [])}
+    header = f"{'shop':<11} {'size':>6} " + " ".join(f"{m:>17}" for m in METRICS)
+    print(header)
+    for row in rows:
+        cells = []
+        prev = base.get((row["shop_type"], row["catalog_size"]))
+        for m in METRICS:
+            cell = f"{row[m]}"
+            if prev is not None and m in prev:
+                cell += f" ({row[m] - prev[m]:+.3g})"
+            cells.append(f"{cell:>17}")
+        print(f"{row['shop_type']:<11} {row['catalog_size']:>6} " + " ".join(cells))
+
+
+async def run(args):
+    llm_gateway.set_model(None)
+    rows = []
+    for shop_type in args.shop_types:
+        rng = random.Random(f"{args.seed}-{shop_type}")
+        messages = corpus.make_corpus(shop_type, args.messages, rng)
+        for size in args.sizes:
+            rows.append(await run_case(shop_type, size, messages, rng))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shop-types", nargs="+", default=list(corpus.ITEMS))
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 500, 5000])
+    parser.add_argument("--messages", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    parser.add_argument("--baseline", help="earlier --output file to diff against")
+    args = parser.parse_args()
+
+    rows = asyncio.run(run(args))
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_table(rows, baseline)
+
+    if args.output:
+        report = {
+            "created_at": datetime.utcnow().isoformat() + "Z",
+            "git_revision": git_revision(),
+            "params": {k: v for k, v in vars(args).items() if k not in ("output", "baseline")},
+            "results": rows,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
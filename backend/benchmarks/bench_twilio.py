@@ -0,0 +1,129 @@
+"""
+Twilio send latency and connection reuse against a local stand-in server.
+
+Starts a minimal HTTP/1.1 server that answers like Twilio's Messages API and
+counts TCP connections, then sends the same messages twice:
+
+- the shared, pooled client from services/twilio_client.py
+- a new httpx.AsyncClient per message (the old behaviour)
+
+The pooled run should open at most TWILIO_MAX_CONNECTIONS connections.
+
+    cd backend
+    python -m benchmarks.bench_twilio --messages 500 --concurrency 10 --latency-ms 5
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+from services import twilio_client
+
+RESPONSE_BODY = b'{"sid": "SMxxxxxxxx", "status": "queued"}'
+
+
+class StandInTwilio:
+    def __init__(self, latency_ms: float):
+        self.latency = latency_ms / 1000
+        self.connections = 0
+        self.requests = 0
+        self.server = None
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.split(b"\r\n"):
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":", 1)[1])
+                if length:
+                    await reader.readexactly(length)
+                self.requests += 1
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                writer.write(
+                    b"HTTP/1.1 201 Created\r\nContent-Type: application/json\r\n"
+                    + f"Content-Length: {len(RESPONSE_BODY)}\r\n\r\n".encode()
+                    + RESPONSE_BODY
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self) -> str:
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        host, port = self.server.sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}"
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+
+async def send_per_message_client(base_url: str, to: str, body: str):
+    async with httpx.AsyncClient() as client_http:
+        response = await client_http.post(
+            f"{base_url}/2010-04-01/Accounts/AC/Messages.json",
+            data={"From": "whatsapp:+10000000000", "To": f"whatsapp:{to}", "Body": body},
+        )
+    return response.json()
+
+
+async def drive(send, count: int, concurrency: int) -> list:
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with semaphore:
+            start = time.perf_counter()
+            await send(f"+9199999{i:05d}", f"Order {i} confirmed")
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    await asyncio.gather(*(one(i) for i in range(count)))
+    return sorted(latencies)
+
+
+def report(name: str, server: StandInTwilio, latencies: list, elapsed: float):
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"{name:<22} {server.connections:>11} {server.requests:>9} "
+          f"{statistics.median(latencies):>8.2f} {p99:>8.2f} {len(latencies) / elapsed:>8.0f}")
+
+
+async def run(args):
+    print(f"{'client':<22} {'connections':>11} {'requests':>9} {'p50 ms':>8} {'p99 ms':>8} {'msg/s':>8}")
+
+    server = StandInTwilio(args.latency_ms)
+    base_url = await server.start()
+    await twilio_client.start(base_url=base_url)
+    start = time.perf_counter()
+    latencies = await drive(twilio_client.send_message, args.messages, args.concurrency)
+    report("pooled (shared)", server, latencies, time.perf_counter() - start)
+    await twilio_client.close()
+    await server.stop()
+
+    server = StandInTwilio(args.latency_ms)
+    base_url = await server.start()
+    start = time.perf_counter()
+    latencies = await drive(lambda to, body: send_per_message_client(base_url, to, body),
+                            args.messages, args.concurrency)
+    report("new client per send", server, latencies, time.perf_counter() - start)
+    await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--latency-ms", type=float, default=5)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Synthetic Hindi / Hinglish / English order corpus and shop catalogs.
+
+Every generated message carries the items it is expected to produce, keyed by
+the base item (e.g. "milk") rather than a product id, because a catalog holds
+many variants of the same item ("Amul Milk 500ml", "Mother Dairy Milk 1L").
+A match counts as correct when the matched product belongs to that base item.
+
+Catalogs are built from the shop templates in templates/shop_templates.py:
+units, attributes and low-stock thresholds come from the template.
+"""
+import random
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+from templates.shop_templates import get_template
+
+# base item -> English catalog word, spoken aliases (Hinglish / Hindi)
+ITEMS: Dict[str, Dict[str, dict]] = {
+    "kirana": {
+        "milk": {"catalog": "Milk", "aliases": ["doodh", "dudh", "milk"], "devanagari": "दूध"},
+        "bread": {"catalog": "Bread", "aliases": ["double roti", "bread", "pav"], "devanagari": "ब्रेड"},
+        "eggs": {"catalog": "Eggs", "aliases": ["anda", "eggs", "egg"], "devanagari": "अंडे"},
+        "rice": {"catalog": "Basmati Rice", "aliases": ["chawal", "rice", "basmati"], "devanagari": "चावल"},
+        "sugar": {"catalog": "Sugar", "aliases": ["cheeni", "sugar", "shakkar"], "devanagari": "चीनी"},
+        "salt": {"catalog": "Salt", "aliases": ["namak", "salt"], "devanagari": "नमक"},
+        "biscuits": {"catalog": "Biscuits", "aliases": ["biscuit", "biskut", "biscuits"], "devanagari": "बिस्कुट"},
+        "oil": {"catalog": "Mustard Oil", "aliases": ["tel", "oil", "sarso tel"], "devanagari": "तेल"},
+    },
+    "bakery": {
+        "bread": {"catalog": "Bread", "aliases": ["bread", "double roti", "bred"], "devanagari": "ब्रेड"},
+        "cake": {"catalog": "Cake", "aliases": ["cake", "kek"], "devanagari": "केक"},
+        "rusk": {"catalog": "Rusk", "aliases": ["rusk", "toast", "rask"], "devanagari": "रस्क"},
+        "cookies": {"catalog": "Cookies", "aliases": ["cookies", "cookie", "biscuit"], "devanagari": "कुकीज़"},
+        "bun": {"catalog": "Bun", "aliases": ["bun", "pav"], "devanagari": "बन"},
+    },
+    "pharmacy": {
+        "paracetamol": {"catalog": "Paracetamol 500mg", "aliases": ["paracetamol", "crocin", "bukhar ki goli"], "devanagari": "पैरासिटामोल"},
+        "bandage": {"catalog": "Bandage Roll", "aliases": ["bandage", "patti", "pattee"], "devanagari": "पट्टी"},
+        "ors": {"catalog": "ORS Sachet", "aliases": ["ors", "electral"], "devanagari": "ओआरएस"},
+        "cough syrup": {"catalog": "Cough Syrup", "aliases": ["cough syrup", "khansi ki dawai", "syrup"], "devanagari": "खांसी की दवा"},
+        "antiseptic": {"catalog": "Antiseptic Liquid", "aliases": ["dettol", "antiseptic"], "devanagari": "डेटॉल"},
+    },
+    "stationery": {
+        "pen": {"catalog": "Ball Pen", "aliases": ["pen", "ball pen", "kalam"], "devanagari": "पेन"},
+        "notebook": {"catalog": "Notebook", "aliases": ["notebook", "copy", "kaapi"], "devanagari": "कॉपी"},
+        "pencil": {"catalog": "Pencil", "aliases": ["pencil", "pensil"], "devanagari": "पेंसिल"},
+        "eraser": {"catalog": "Eraser", "aliases": ["eraser", "rubber"], "devanagari": "रबर"},
+        "glue": {"catalog": "Glue Stick", "aliases": ["glue", "gond", "fevistick"], "devanagari": "गोंद"},
+    },
+}
+
+BRANDS = ["Amul", "Tata", "Parle", "Britannia", "Classmate", "Cipla", "Dabur", "Nestle", "Haldiram", "Local"]
+# Look-alike products one letter away from a common order word; any match to one is wrong
+DECOYS = ["Pea", "Foil", "Malt Drink", "Silk Saree", "Dice Set", "Aluminium Foil"]
+SIZES = ["", "Small", "Large", "500g", "1kg", "Pack of 2", "Family Pack", "Mini"]
+
+QTY_EN = {1: "one", 2: "two", 3: "three", 4: "four", 5: "five"}
+QTY_HI = {1: "ek", 2: "do", 3: "teen", 4: "char", 5: "paanch"}
+QTY_DEVANAGARI = {1: "एक", 2: "दो", 3: "तीन", 4: "चार", 5: "पांच"}
+
+STYLES = ["english", "hinglish", "hindi"]
+
+
+@dataclass
+class Message:
+    text: str
+    style: str
+    expected: List[dict] = field(default_factory=list)  # [{"item": base, "quantity": n}]
+
+
+def fill_attributes(template: dict, rng: random.Random) -> dict:
+    attrs = {}
+    for attr in template.get("attributes", []):
+        kind = attr.get("type")
+        if kind == "select" and attr.get("options"):
+            attrs[attr["key"]] = rng.choice(attr["options"])
+        elif kind == "number":
+            attrs[attr["key"]] = rng.randint(10, 500)
+        elif kind == "date":
+            attrs[attr["key"]] = f"2026-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+        elif attr["key"] == "brand":
+            attrs[attr["key"]] = rng.choice(BRANDS)
+        else:
+            attrs[attr["key"]] = ""
+    return attrs
+
+
+def make_catalog(shop_type: str, shop_id: str, size: int, rng: random.Random) -> List[dict]:
+    """`size` products for a shop of `shop_type`, each tagged with its base item, plus DECOYS."""
+    template = get_template(shop_type)
+    items = ITEMS[shop_type]
+    products, names = [], set()
+    # One plain product per base item so every expected item is orderable
+    pool = [(base, spec["catalog"]) for base, spec in items.items()]
+    attempts = 0
+    while len(products) < size:
+        if pool:
+            base, name = pool.pop(0)
+        else:
+            base = rng.choice(list(items))
+            parts = [rng.choice(BRANDS), items[base]["catalog"], rng.choice(SIZES)]
+            attempts += 1
+            if attempts > size * 3:
+                parts.append(str(attempts))
+            name = " ".join(p for p in parts if p)
+        if name in names:
+            continue
+        names.add(name)
+        products.append({
+            "_id": f"{shop_id}-{len(products)}",
+            "shop_id": shop_id,
+            "name": name,
+            "base": base,
+            "price": rng.randint(5, 500),
+            "stock": rng.randint(0, 200),
+            "unit": rng.choice(template["units"]),
+            "attributes": fill_attributes(template, rng),
+            "low_stock_alert": template["low_stock_threshold"],
+            "active": True,
+        })
+    for name in DECOYS:
+        products.append({
+            "_id": f"{shop_id}-{len(products)}",
+            "shop_id": shop_id,
+            "name": name,
+            "base": "decoy",
+            "price": rng.randint(5, 500),
+            "stock": 100,
+            "unit": template["units"][0],
+            "attributes": {},
+            "low_stock_alert": template["low_stock_threshold"],
+            "active": True,
+        })
+    return products
+
+
+def render_item(spec: dict, qty: int, style: str, rng: random.Random) -> str:
+    if style == "hindi":
+        return f"{QTY_DEVANAGARI[qty]} {spec['devanagari']}"
+    if style == "english":
+        alias = spec["catalog"].lower() if rng.random() < 0.6 else rng.choice(spec["aliases"])
+        number = QTY_EN[qty] if rng.random() < 0.3 else str(qty)
+        return f"{number} {alias}"
+    alias = rng.choice(spec["aliases"])
+    number = QTY_HI[qty] if rng.random() < 0.4 else str(qty)
+    return f"{number} {alias}"
+
+
+def make_message(shop_type: str, rng: random.Random, style: str = None) -> Message:
+    style = style or rng.choice(STYLES)
+    items = ITEMS[shop_type]
+    chosen = rng.sample(list(items), k=rng.randint(1, min(4, len(items))))
+    expected, parts = [], []
+    for base in chosen:
+        qty = rng.randint(1, 5)
+        expected.append({"item": base, "quantity": qty})
+        parts.append(render_item(items[base], qty, style, rng))
+
+    if style == "english":
+        text = rng.choice(["", "please send "]) + " and ".join(parts)
+    elif style == "hinglish":
+        text = rng.choice(["", "bhaiya ", "bhaiya ji "]) + " aur ".join(parts) + rng.choice(["", " please", " bhej do"])
+    else:
+        text = " और ".join(parts) + rng.choice(["", " भेज दो"])
+    return Message(text=text, style=style, expected=expected)
+
+
+def make_corpus(shop_type: str, count: int, rng: random.Random) -> List[Message]:
+    return [make_message(shop_type, rng) for _ in range(count)]
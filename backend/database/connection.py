@@ -4,6 +4,10 @@ import os
 
 MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
 DB_NAME = os.getenv("DB_NAME", "bazaarmind")
+OUTBOUND_RETENTION_SECONDS = int(os.getenv("OUTBOUND_RETENTION_SECONDS", str(7 * 24 * 3600)))
+PARSE_CACHE_TTL_SECONDS = int(os.getenv("PARSE_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", str(2 * 24 * 3600)))
+WHATSAPP_SESSION_TTL_SECONDS = int(os.getenv("WHATSAPP_SESSION_TTL_SECONDS", str(24 * 3600)))
 
 client = None
 db = None
@@ -14,9 +18,47 @@ async def connect_db():
     db = client[DB_NAME]
     # Create indexes
     await db.shops.create_index([("phone", ASCENDING)], unique=True)
+    await db.shops.create_index([("whatsapp_number", ASCENDING)])
     await db.products.create_index([("shop_id", ASCENDING)])
-    await db.orders.create_index([("shop_id", ASCENDING)])
+    # Low-stock lists only ever touch the flagged products
+    await db.products.create_index(
+        [("shop_id", ASCENDING), ("is_low", ASCENDING)],
+        partialFilterExpression={"is_low": True},
+    )
+    # Product search (services/product_search.py), multikey over the edge-grams
+    await db.products.create_index([("shop_id", ASCENDING), ("search_grams", ASCENDING)])
+    # Bulk import upsert keys (services/catalog_import.py)
+    await db.products.create_index([("shop_id", ASCENDING), ("name", ASCENDING)])
+    # Catalog version (latest updated_at) for product list ETags
+    await db.products.create_index([("shop_id", ASCENDING), ("updated_at", ASCENDING)])
+    await db.products.create_index(
+        [("shop_id", ASCENDING), ("attributes.barcode", ASCENDING)],
+        partialFilterExpression={"attributes.barcode": {"$exists": True}},
+    )
+    # Keyset pagination for order lists (routes/orders.list_orders)
+    await db.orders.create_index([("shop_id", ASCENDING), ("created_at", ASCENDING), ("_id", ASCENDING)])
+    await db.orders.create_index(
+        [("shop_id", ASCENDING), ("status", ASCENDING), ("created_at", ASCENDING), ("_id", ASCENDING)]
+    )
     await db.orders.create_index([("created_at", ASCENDING)])
+    await db.stock_movements.create_index(
+        [("shop_id", ASCENDING), ("product_id", ASCENDING), ("created_at", ASCENDING)]
+    )
+    await db.shop_synonyms.create_index([("shop_id", ASCENDING), ("term", ASCENDING)], unique=True)
+    await db.whatsapp_sessions.create_index(
+        [("shop_id", ASCENDING), ("customer_phone", ASCENDING)], unique=True
+    )
+    await db.whatsapp_sessions.create_index([("expires_at", ASCENDING)], expireAfterSeconds=0)
+    await db.whatsapp_messages.create_index([("status", ASCENDING), ("timestamp", ASCENDING)])
+    await db.outbound_messages.create_index([("status", ASCENDING), ("next_attempt_at", ASCENDING)])
+    await db.outbound_messages.create_index([("sent_at", ASCENDING)], expireAfterSeconds=OUTBOUND_RETENTION_SECONDS)
+    await db.llm_parse_cache.create_index(
+        [("created_at", ASCENDING)], expireAfterSeconds=PARSE_CACHE_TTL_SECONDS
+    )
+    # Processed Twilio MessageSids (the SID is the unique _id)
+    await db.processed_messages.create_index(
+        [("created_at", ASCENDING)], expireAfterSeconds=IDEMPOTENCY_TTL_SECONDS
+    )
     print(f"✅ Connected to MongoDB: {DB_NAME}")
 
 async def close_db():
@@ -27,3 +69,6 @@ async def close_db():
 
 def get_db():
     return db
+
+def get_client():
+    return client
@@ -5,12 +5,26 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from database.connection import connect_db, close_db
-from routes import shops, products, orders, whatsapp, analytics
+from routes import shops, products, orders, whatsapp, analytics, admin
+from services.ai_parser import shutdown_parse_pool, batcher
+from services import twilio_client, outbound_queue, inbound_worker, shop_router
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await connect_db()
+    await shop_router.warm()
+    await twilio_client.start()
+    outbound_queue.queue.start()
+    if inbound_worker.WEBHOOK_ASYNC:
+        inbound_worker.dispatcher.start(whatsapp.handle_inbound_message)
+        await inbound_worker.dispatcher.recover()
     yield
+    await inbound_worker.dispatcher.stop()
+    if batcher:
+        await batcher.drain()
+    await outbound_queue.queue.stop()
+    await twilio_client.close()
+    shutdown_parse_pool()
     await close_db()
 
 app = FastAPI(
@@ -26,6 +40,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
 app.include_router(shops.router, prefix="/api/shops", tags=["Shops"])
@@ -33,6 +48,7 @@ app.include_router(products.router, prefix="/api/products", tags=["Products"])
 app.include_router(orders.router, prefix="/api/orders", tags=["Orders"])
 app.include_router(whatsapp.router, prefix="/api/whatsapp", tags=["WhatsApp"])
 app.include_router(analytics.router, prefix="/api/analytics", tags=["Analytics"])
+app.include_router(admin.router, prefix="/api/admin", tags=["Admin"])
 
 @app.get("/")
 async def root():
@@ -0,0 +1,35 @@
+"""
+One-off backfill of the materialized `is_low` flag on products.
+
+Every stock write now maintains `is_low` (stock <= low_stock_alert), but
+products written before that change have no flag and would be missing from
+low-stock lists. This recomputes it for every product in one server-side
+update pipeline, so no documents travel to the client. Safe to re-run.
+
+    cd backend
+    python -m migrations.backfill_is_low
+"""
+import asyncio
+
+from database.connection import connect_db, close_db, get_db
+from services.inventory import IS_LOW_STAGE
+
+
+async def backfill() -> int:
+    db = get_db()
+    result = await db.products.update_many({}, [IS_LOW_STAGE])
+    return result.modified_count
+
+
+async def main():
+    await connect_db()
+    try:
+        modified = await backfill()
+        low = await get_db().products.count_documents({"is_low": True})
+        print(f"Backfilled is_low on {modified} product(s); {low} are low on stock")
+    finally:
+        await close_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
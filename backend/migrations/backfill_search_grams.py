@@ -0,0 +1,54 @@
+"""
+One-off backfill of `search_grams` (services/product_search.py) on products.
+
+Products created or updated after product search shipped already carry their
+grams; this fills them in for the rest, in bulk_write batches. Safe to re-run.
+Pass --all to recompute every product after the gram scheme changes (e.g.
+MAX_GRAM, or the trigrams added for infix matching).
+
+    cd backend
+    python -m migrations.backfill_search_grams
+    python -m migrations.backfill_search_grams --all   # products indexed before infix search
+"""
+import argparse
+import asyncio
+
+from pymongo import UpdateOne
+
+from database.connection import connect_db, close_db, get_db
+from services.product_search import grams
+
+BATCH_SIZE = 1000
+
+
+async def backfill(recompute_all: bool = False) -> int:
+    db = get_db()
+    query = {} if recompute_all else {"search_grams": {"$exists": False}}
+    updated = 0
+    batch = []
+    async for doc in db.products.find(query, {"name": 1, "attributes": 1}).batch_size(BATCH_SIZE):
+        batch.append(UpdateOne(
+            {"_id": doc["_id"]},
+            {"$set": {"search_grams": grams(doc.get("name", ""), doc.get("attributes"))}},
+        ))
+        if len(batch) >= BATCH_SIZE:
+            updated += (await db.products.bulk_write(batch, ordered=False)).modified_count
+            batch = []
+    if batch:
+        updated += (await db.products.bulk_write(batch, ordered=False)).modified_count
+    return updated
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--all", action="store_true", help="recompute products that already have grams")
+    args = parser.parse_args()
+    await connect_db()
+    try:
+        print(f"Backfilled search_grams on {await backfill(args.all)} product(s)")
+    finally:
+        await close_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -46,6 +46,10 @@ class ShopResponse(BaseModel):
     created_at: datetime
     template: dict
 
+class ShopSynonyms(BaseModel):
+    # term -> canonical product word, e.g. {"dudh": "milk"}; "" drops the term
+    synonyms: Dict[str, str]
+
 # ── Product Models ────────────────────────────────────────────────────────────
 
 class ProductCreate(BaseModel):
@@ -84,6 +88,17 @@ class ProductResponse(BaseModel):
     created_at: datetime
     updated_at: datetime
 
+class StockLine(BaseModel):
+    # Identify the product by id or barcode; give either a delta or the counted stock
+    product_id: Optional[str] = None
+    barcode: Optional[str] = None
+    delta: Optional[int] = None
+    count: Optional[int] = None
+
+class BulkStockAdjust(BaseModel):
+    lines: List[StockLine] = Field(..., max_length=5000)
+    reason: Optional[str] = "bulk_adjustment"
+
 # ── Order Models ──────────────────────────────────────────────────────────────
 
 class OrderItem(BaseModel):
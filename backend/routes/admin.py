@@ -0,0 +1,25 @@
+from fastapi import APIRouter
+from services import llm_gateway, parse_cache, twilio_client, outbound_queue, inbound_worker, idempotency, shop_router
+from services.ai_parser import parse_stats, batcher
+
+router = APIRouter()
+
+@router.get("/metrics")
+async def metrics():
+    """Runtime counters for the in-process pipelines."""
+    return {
+        "llm": llm_gateway.gateway.stats(),
+        "parser": parse_stats(),
+        "parse_cache": parse_cache.stats(),
+        "llm_batching": batcher.stats() if batcher else None,
+        "twilio": twilio_client.stats(),
+        "outbound_queue": await outbound_queue.queue.stats(),
+        "inbound": await inbound_worker.dispatcher.stats(),
+        "idempotency": idempotency.stats(),
+        "shop_routing": shop_router.stats(),
+    }
+
+@router.delete("/parse-cache")
+async def purge_parse_cache():
+    """Drop every cached LLM parse result (both tiers)."""
+    return await parse_cache.purge()
@@ -35,14 +35,7 @@ async def dashboard_stats(shop_id: str = Query(...)):
     today_revenue = today_rev[0]["total"] if today_rev else 0
 
     # Low stock
-    low_stock_pipeline = [
-        {"$match": {"shop_id": shop_id, "active": True}},
-        {"$addFields": {"is_low": {"$lte": ["$stock", "$low_stock_alert"]}}},
-        {"$match": {"is_low": True}},
-        {"$count": "count"}
-    ]
-    low_stock = await db.products.aggregate(low_stock_pipeline).to_list(1)
-    low_stock_count = low_stock[0]["count"] if low_stock else 0
+    low_stock_count = await db.products.count_documents({"shop_id": shop_id, "is_low": True, "active": True})
 
     # WhatsApp orders
     wa_orders = await db.orders.count_documents({"shop_id": shop_id, "channel": "whatsapp"})
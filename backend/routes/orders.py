@@ -1,6 +1,7 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Response
 from database.connection import get_db
 from models.schemas import OrderCreate, OrderStatus
+from services import inventory, pagination, export
 from bson import ObjectId
 from datetime import datetime
 
@@ -16,39 +17,44 @@ async def create_order(order: OrderCreate):
     db = get_db()
 
     # Validate shop
-    shop = await db.shops.find_one({"_id": ObjectId(order.shop_id)})
+    shop = await db.shops.find_one({"_id": ObjectId(order.shop_id)}, {"_id": 1})
     if not shop:
         raise HTTPException(404, "Shop not found")
 
-    # Validate stock for each item and build confirmed items
-    confirmed_items = []
-    total = 0.0
+    # Fetch every referenced product in one query
+    product_ids = {item.product_id for item in order.items}
+    products = {
+        str(p["_id"]): p
+        async for p in db.products.find(
+            {"_id": {"$in": [ObjectId(pid) for pid in product_ids]}}, {"name": 1, "stock": 1}
+        )
+    }
 
+    # Validate stock in memory (a product listed twice counts both lines)
+    requested = {}
     for item in order.items:
-        product = await db.products.find_one({"_id": ObjectId(item.product_id)})
+        product = products.get(item.product_id)
         if not product:
             raise HTTPException(404, f"Product '{item.product_name}' not found")
-        if product["stock"] < item.quantity:
+        requested[item.product_id] = requested.get(item.product_id, 0) + item.quantity
+        if product["stock"] < requested[item.product_id]:
             raise HTTPException(400, f"Insufficient stock for '{product['name']}'. Available: {product['stock']}")
 
+    confirmed_items = []
+    total = 0.0
+    for item in order.items:
         item_total = item.unit_price * item.quantity
         total += item_total
         confirmed_items.append({
             "product_id": item.product_id,
-            "product_name": product["name"],
+            "product_name": products[item.product_id]["name"],
             "quantity": item.quantity,
             "unit_price": item.unit_price,
             "total": item_total,
         })
 
-    # Deduct stock
-    for item in order.items:
-        await db.products.update_one(
-            {"_id": ObjectId(item.product_id)},
-            {"$inc": {"stock": -item.quantity}, "$set": {"updated_at": datetime.utcnow()}}
-        )
-
     # Create order document
+    now = datetime.utcnow()
     doc = {
         "shop_id": order.shop_id,
         "customer_phone": order.customer_phone,
@@ -58,30 +64,93 @@ async def create_order(order: OrderCreate):
         "status": "confirmed",
         "channel": order.channel,
         "notes": order.notes,
-        "created_at": datetime.utcnow(),
-        "updated_at": datetime.utcnow(),
+        "created_at": now,
+        "updated_at": now,
     }
 
-    result = await db.orders.insert_one(doc)
-    created = await db.orders.find_one({"_id": result.inserted_id})
-    return fix_id(created)
+    # Deduct stock (guarded, one bulk write) and store the order; the
+    # in-memory check above can race, the guarded write cannot
+    try:
+        await inventory.commit_order(doc)
+    except inventory.StockShortfall as e:
+        short = e.shortfalls[0]
+        raise HTTPException(400, f"Insufficient stock for '{short['product_name']}'. Available: {short['available']}")
+    return fix_id(doc)
 
 @router.get("/")
 async def list_orders(
+    response: Response,
     shop_id: str = Query(...),
     status: str = Query(None),
     channel: str = Query(None),
-    limit: int = Query(50),
+    limit: int = Query(50, ge=1, le=200),
+    cursor: str = Query(None, description="X-Next-Cursor value from the previous page"),
+    fields: str = Query(None, description="Comma-separated fields to return, e.g. status,total_amount"),
 ):
+    """Newest first. A full page sets X-Next-Cursor; pass it back as `cursor` for the next one."""
     db = get_db()
     query = {"shop_id": shop_id}
     if status:
         query["status"] = status
     if channel:
         query["channel"] = channel
-    orders = await db.orders.find(query).sort("created_at", -1).limit(limit).to_list(limit)
+    try:
+        query.update(pagination.after("created_at", cursor))
+        fields_projection = pagination.projection(fields, always=["created_at"])
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+    # (shop_id[, status], created_at, _id) index: each page is one seek
+    orders = await (
+        db.orders.find(query, fields_projection)
+        .sort([("created_at", -1), ("_id", -1)])
+        .limit(limit + 1)
+        .to_list(limit + 1)
+    )
+    if len(orders) > limit:
+        orders = orders[:limit]
+        last = orders[-1]
+        response.headers[pagination.NEXT_CURSOR_HEADER] = pagination.encode_cursor(last["created_at"], last["_id"])
     return [fix_id(o) for o in orders]
 
+ORDER_EXPORT_COLUMNS = [
+    "id", "created_at", "customer_name", "customer_phone", "channel", "status", "total_amount", "items", "notes",
+]
+
+
+def order_export_row(doc: dict) -> dict:
+    doc = fix_id(doc)
+    doc["items"] = "; ".join(f"{i['quantity']}x {i['product_name']}" for i in doc.get("items", []))
+    return doc
+
+
+@router.get("/export")
+async def export_orders(
+    shop_id: str = Query(...),
+    start: datetime = Query(None, description="Created at or after (ISO date/time)"),
+    end: datetime = Query(None, description="Created before (ISO date/time)"),
+    fmt: str = Query("ndjson", alias="format", description="ndjson | csv"),
+    gzip: bool = Query(False),
+):
+    """Stream every matching order, oldest first, without loading them into memory."""
+    if fmt not in export.FORMATS:
+        raise HTTPException(400, f"format must be one of: {list(export.FORMATS)}")
+    db = get_db()
+    query = {"shop_id": shop_id}
+    if start or end:
+        query["created_at"] = {}
+        if start:
+            query["created_at"]["$gte"] = start
+        if end:
+            query["created_at"]["$lt"] = end
+    docs = (
+        db.orders.find(query)
+        .sort([("created_at", 1), ("_id", 1)])
+        .batch_size(export.EXPORT_BATCH_SIZE)
+    )
+    transform = order_export_row if fmt == "csv" else fix_id
+    return export.stream(docs, fmt, f"orders-{shop_id}", ORDER_EXPORT_COLUMNS, transform, gzip)
+
 @router.get("/{order_id}")
 async def get_order(order_id: str):
     db = get_db()
@@ -1,7 +1,9 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, Header, HTTPException, Query, Request, Response
 from database.connection import get_db
-from models.schemas import ProductCreate, ProductUpdate
+from models.schemas import ProductCreate, ProductUpdate, BulkStockAdjust
 from templates.shop_templates import get_template
+from services import catalog_index, export, catalog_import, stock_ledger, inventory, product_search, pagination
+from pymongo import ReturnDocument
 from bson import ObjectId
 from datetime import datetime
 
@@ -27,45 +29,139 @@ async def create_product(product: ProductCreate):
     doc = product.dict()
     doc["shop_type"] = shop["shop_type"]
     doc["low_stock_alert"] = low_stock
+    doc["is_low"] = inventory.is_low(doc["stock"], low_stock)
+    doc["search_grams"] = product_search.grams(doc["name"], doc.get("attributes"))
     doc["created_at"] = datetime.utcnow()
     doc["updated_at"] = datetime.utcnow()
 
     result = await db.products.insert_one(doc)
-    created = await db.products.find_one({"_id": result.inserted_id})
+    created = await db.products.find_one({"_id": result.inserted_id}, product_search.HIDDEN_FIELDS)
+    catalog_index.product_saved(created)
     return fix_id(created)
 
+@router.post("/import")
+async def import_products(
+    request: Request,
+    shop_id: str = Query(...),
+    fmt: str = Query(None, alias="format", description="csv | ndjson (default: from Content-Type)"),
+):
+    """Bulk upsert from a CSV / NDJSON request body, keyed by barcode or name."""
+    db = get_db()
+    shop = await db.shops.find_one({"_id": ObjectId(shop_id)}, {"shop_type": 1})
+    if not shop:
+        raise HTTPException(404, "Shop not found")
+    fmt = catalog_import.detect_format(fmt, request.headers.get("content-type"))
+    if fmt not in ("csv", "ndjson"):
+        raise HTTPException(400, "format must be csv or ndjson")
+
+    template = get_template(shop["shop_type"])
+    rows = catalog_import.rows_from(request.stream(), fmt)
+    report = await catalog_import.import_catalog(shop_id, shop["shop_type"], template, rows)
+    catalog_index.invalidate_shop(shop_id)
+    return report
+
+async def catalog_version(shop_id: str) -> tuple:
+    """(latest updated_at, product count): every product write stamps updated_at, deletes change the count."""
+    db = get_db()
+    latest = await db.products.find_one(
+        {"shop_id": shop_id}, {"updated_at": 1}, sort=[("updated_at", -1)]
+    )
+    count = await db.products.count_documents({"shop_id": shop_id})
+    return (latest or {}).get("updated_at"), count
+
 @router.get("/")
 async def list_products(
+    response: Response,
     shop_id: str = Query(..., description="Shop ID"),
     active_only: bool = Query(False),
     low_stock: bool = Query(False),
+    limit: int = Query(500, ge=1, le=1000),
+    cursor: str = Query(None, description="X-Next-Cursor value from the previous page"),
+    fields: str = Query(None, description="Comma-separated fields to return, e.g. name,price,stock"),
+    if_none_match: str = Header(None),
 ):
+    """By name. A full page sets X-Next-Cursor; an unchanged catalog answers If-None-Match with 304."""
     db = get_db()
     query = {"shop_id": shop_id}
     if active_only:
         query["active"] = True
     if low_stock:
-        # Products where stock <= low_stock_alert
-        query["$expr"] = {"$lte": ["$stock", "$low_stock_alert"]}
-    products = await db.products.find(query).to_list(500)
+        # Materialized stock <= low_stock_alert flag (partial index on shop_id, is_low)
+        query["is_low"] = True
+    try:
+        query.update(pagination.after("name", cursor, descending=False))
+        fields_projection = pagination.projection(fields, always=["name"]) or product_search.HIDDEN_FIELDS
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+    # (shop_id, updated_at) index + count on shop_id: two index-only lookups
+    version = await catalog_version(shop_id)
+    tag = pagination.etag(shop_id, *version, active_only, low_stock, limit, cursor, fields)
+    headers = {pagination.ETAG_HEADER: tag, "Cache-Control": "private, no-cache"}
+    if pagination.not_modified(if_none_match, tag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+
+    products = await (
+        db.products.find(query, fields_projection)
+        .sort([("name", 1), ("_id", 1)])
+        .limit(limit + 1)
+        .to_list(limit + 1)
+    )
+    if len(products) > limit:
+        products = products[:limit]
+        last = products[-1]
+        response.headers[pagination.NEXT_CURSOR_HEADER] = pagination.encode_cursor(last["name"], last["_id"])
     return [fix_id(p) for p in products]
 
+@router.get("/search")
+async def search_products(
+    shop_id: str = Query(...),
+    q: str = Query(..., min_length=1),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    fields: str = Query(None, description="Comma-separated fields to return"),
+):
+    """Prefix / substring search over name, brand and barcode, best matches first."""
+    try:
+        projection = pagination.projection(fields)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    found = await product_search.search(shop_id, q, limit, offset, projection)
+    found["results"] = [fix_id(p) for p in found["results"]]
+    return found
+
 @router.get("/low-stock")
 async def low_stock_products(shop_id: str = Query(...)):
     db = get_db()
     # Find products where current stock <= alert threshold
-    pipeline = [
-        {"$match": {"shop_id": shop_id}},
-        {"$addFields": {"is_low": {"$lte": ["$stock", "$low_stock_alert"]}}},
-        {"$match": {"is_low": True}},
-    ]
-    products = await db.products.aggregate(pipeline).to_list(100)
+    products = await db.products.find(
+        {"shop_id": shop_id, "is_low": True}, product_search.HIDDEN_FIELDS
+    ).to_list(100)
     return [fix_id(p) for p in products]
 
+PRODUCT_EXPORT_COLUMNS = [
+    "id", "name", "price", "stock", "unit", "low_stock_alert", "active", "description", "attributes", "updated_at",
+]
+
+
+@router.get("/export")
+async def export_products(
+    shop_id: str = Query(...),
+    fmt: str = Query("ndjson", alias="format", description="ndjson | csv"),
+    gzip: bool = Query(False),
+):
+    """Stream the whole catalog; `attributes` is a JSON cell in CSV."""
+    if fmt not in export.FORMATS:
+        raise HTTPException(400, f"format must be one of: {list(export.FORMATS)}")
+    db = get_db()
+    docs = db.products.find({"shop_id": shop_id}, product_search.HIDDEN_FIELDS).batch_size(export.EXPORT_BATCH_SIZE)
+    return export.stream(docs, fmt, f"products-{shop_id}", PRODUCT_EXPORT_COLUMNS, fix_id, gzip)
+
 @router.get("/{product_id}")
 async def get_product(product_id: str):
     db = get_db()
-    product = await db.products.find_one({"_id": ObjectId(product_id)})
+    product = await db.products.find_one({"_id": ObjectId(product_id)}, product_search.HIDDEN_FIELDS)
     if not product:
         raise HTTPException(404, "Product not found")
     return fix_id(product)
@@ -75,32 +171,68 @@ async def update_product(product_id: str, update: ProductUpdate):
     db = get_db()
     data = {k: v for k, v in update.dict().items() if v is not None}
     data["updated_at"] = datetime.utcnow()
-    result = await db.products.update_one({"_id": ObjectId(product_id)}, {"$set": data})
+    result = await db.products.update_one(
+        {"_id": ObjectId(product_id)}, [inventory.set_stage(data), inventory.IS_LOW_STAGE]
+    )
     if result.matched_count == 0:
         raise HTTPException(404, "Product not found")
-    updated = await db.products.find_one({"_id": ObjectId(product_id)})
+    updated = await db.products.find_one({"_id": ObjectId(product_id)}, product_search.HIDDEN_FIELDS)
+    if "name" in data or "attributes" in data:
+        search_grams = product_search.grams(updated["name"], updated.get("attributes"))
+        await db.products.update_one({"_id": updated["_id"]}, {"$set": {"search_grams": search_grams}})
+    catalog_index.product_saved(updated)
     return fix_id(updated)
 
 @router.delete("/{product_id}")
 async def delete_product(product_id: str):
     db = get_db()
-    result = await db.products.delete_one({"_id": ObjectId(product_id)})
-    if result.deleted_count == 0:
+    deleted = await db.products.find_one_and_delete({"_id": ObjectId(product_id)}, {"shop_id": 1})
+    if not deleted:
         raise HTTPException(404, "Product not found")
+    catalog_index.product_deleted(deleted["shop_id"], product_id)
     return {"message": "Product deleted"}
 
+@router.post("/adjust-stock/bulk")
+async def bulk_adjust_stock(body: BulkStockAdjust, shop_id: str = Query(...)):
+    """Stocktake / delivery receipt: many (product_id | barcode, delta | count) lines in one write."""
+    results = await inventory.bulk_adjust(shop_id, body.lines, body.reason or "bulk_adjustment")
+    applied = sum(1 for r in results if r.get("status") == "ok")
+    return {"applied": applied, "failed": len(results) - applied, "results": results}
+
 @router.post("/{product_id}/adjust-stock")
-async def adjust_stock(product_id: str, adjustment: int):
+async def adjust_stock(product_id: str, adjustment: int, reason: str = Query("manual_adjustment")):
     """Add or subtract stock. Use negative for reduction."""
     db = get_db()
-    product = await db.products.find_one({"_id": ObjectId(product_id)})
+    query = {"_id": ObjectId(product_id)}
+    if adjustment < 0:
+        query["stock"] = {"$gte": -adjustment}
+    # One atomic round trip: concurrent adjustments cannot overwrite each other
+    product = await db.products.find_one_and_update(
+        query,
+        [
+            {"$set": {"stock": {"$add": ["$stock", adjustment]}, "updated_at": datetime.utcnow()}},
+            inventory.IS_LOW_STAGE,
+        ],
+        projection={"shop_id": 1, "stock": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    if not product:
+        current = await db.products.find_one({"_id": ObjectId(product_id)}, {"stock": 1})
+        if not current:
+            raise HTTPException(404, "Product not found")
+        raise HTTPException(400, f"Insufficient stock. Current: {current['stock']}")
+    await stock_ledger.record([
+        stock_ledger.movement(product["shop_id"], product_id, adjustment, reason, stock_after=product["stock"])
+    ])
+    catalog_index.stock_changed(product["shop_id"], product_id, product["stock"])
+    return {"product_id": product_id, "old_stock": product["stock"] - adjustment, "new_stock": product["stock"]}
+
+@router.get("/{product_id}/stock-movements")
+async def stock_movements(product_id: str, limit: int = Query(100, ge=1, le=1000)):
+    """Newest-first stock ledger for one product."""
+    db = get_db()
+    product = await db.products.find_one({"_id": ObjectId(product_id)}, {"shop_id": 1, "stock": 1})
     if not product:
         raise HTTPException(404, "Product not found")
-    new_stock = product["stock"] + adjustment
-    if new_stock < 0:
-        raise HTTPException(400, f"Insufficient stock. Current: {product['stock']}")
-    await db.products.update_one(
-        {"_id": ObjectId(product_id)},
-        {"$set": {"stock": new_stock, "updated_at": datetime.utcnow()}}
-    )
-    return {"product_id": product_id, "old_stock": product["stock"], "new_stock": new_stock}
+    movements = await stock_ledger.history(product["shop_id"], product_id, limit)
+    return {"product_id": product_id, "stock": product["stock"], "movements": movements}
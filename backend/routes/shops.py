@@ -1,7 +1,9 @@
 from fastapi import APIRouter, HTTPException
 from database.connection import get_db
-from models.schemas import ShopCreate, ShopUpdate
+from models.schemas import ShopCreate, ShopUpdate, ShopSynonyms
 from templates.shop_templates import get_template, get_all_shop_types, get_categories
+from services import catalog_index, normalizer, shop_router
+from pymongo import UpdateOne
 from bson import ObjectId
 from datetime import datetime
 
@@ -32,6 +34,7 @@ async def create_shop(shop: ShopCreate):
     try:
         result = await db.shops.insert_one(doc)
         created = await db.shops.find_one({"_id": result.inserted_id})
+        shop_router.shop_saved(created)
         return fix_id(created)
     except Exception as e:
         if "duplicate" in str(e).lower():
@@ -61,6 +64,7 @@ async def update_shop(shop_id: str, update: ShopUpdate):
     if result.matched_count == 0:
         raise HTTPException(404, "Shop not found")
     updated = await db.shops.find_one({"_id": ObjectId(shop_id)})
+    shop_router.shop_saved(updated)
     return fix_id(updated)
 
 @router.delete("/{shop_id}")
@@ -69,4 +73,45 @@ async def delete_shop(shop_id: str):
     result = await db.shops.delete_one({"_id": ObjectId(shop_id)})
     if result.deleted_count == 0:
         raise HTTPException(404, "Shop not found")
+    shop_router.shop_deleted(shop_id)
+    catalog_index.invalidate_shop(shop_id)
+    await db.shop_synonyms.delete_many({"shop_id": shop_id})
+    normalizer.forget_shop(shop_id)
     return {"message": "Shop deleted"}
+
+@router.get("/{shop_id}/synonyms")
+async def get_shop_synonyms(shop_id: str):
+    """Shop-specific synonyms, merged over the global dictionary when parsing."""
+    return {"synonyms": await normalizer.load_shop_terms(shop_id)}
+
+@router.put("/{shop_id}/synonyms")
+async def set_shop_synonyms(shop_id: str, body: ShopSynonyms):
+    db = get_db()
+    terms = {
+        " ".join(term.lower().split()): canonical.strip().lower()
+        for term, canonical in body.synonyms.items()
+        if term.strip()
+    }
+    if not terms:
+        raise HTTPException(400, "No synonyms given")
+    now = datetime.utcnow()
+    await db.shop_synonyms.bulk_write([
+        UpdateOne(
+            {"shop_id": shop_id, "term": term},
+            {"$set": {"canonical": canonical, "updated_at": now}},
+            upsert=True,
+        )
+        for term, canonical in terms.items()
+    ])
+    normalizer.terms_changed(shop_id, added=terms)
+    return {"synonyms": await normalizer.load_shop_terms(shop_id)}
+
+@router.delete("/{shop_id}/synonyms/{term}")
+async def delete_shop_synonym(shop_id: str, term: str):
+    db = get_db()
+    term = " ".join(term.lower().split())
+    result = await db.shop_synonyms.delete_one({"shop_id": shop_id, "term": term})
+    if result.deleted_count == 0:
+        raise HTTPException(404, "Synonym not found")
+    normalizer.terms_changed(shop_id, removed=[term])
+    return {"message": "Synonym deleted"}
@@ -1,49 +1,19 @@
 from fastapi import APIRouter, Request, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from database.connection import get_db
 from models.schemas import WhatsAppMessage
-from services.ai_parser import parse_order
+from services.ai_parser import parse_order, parse_orders_stream
+from services import outbound_queue, inbound_worker, idempotency, shop_router, session_store, inventory
 from bson import ObjectId
 from datetime import datetime
-import os
-import httpx
-import google.generativeai as genai  # ✅ Gemini
+import json
 
 router = APIRouter()
 
-TWILIO_SID = os.getenv("TWILIO_ACCOUNT_SID", "")
-TWILIO_TOKEN = os.getenv("TWILIO_AUTH_TOKEN", "")
-TWILIO_WHATSAPP = os.getenv("TWILIO_WHATSAPP_NUMBER", "whatsapp:+14155238886")
-
-# ✅ Gemini initialization
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-
-if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
-    gemini_model = genai.GenerativeModel("gemini-1.5-flash-latest")
-else:
-    gemini_model = None
-
 
 async def send_whatsapp_reply(to: str, message: str):
-    if not TWILIO_SID or not TWILIO_TOKEN:
-        print(f"[WHATSAPP MOCK] To: {to}\nMessage: {message}")
-        return {"status": "mock_sent"}
-    
-    url = f"https://api.twilio.com/2010-04-01/Accounts/{TWILIO_SID}/Messages.json"
-    data = {
-        "From": TWILIO_WHATSAPP,
-        "To": f"whatsapp:{to}",
-        "Body": message,
-    }
-
-    async with httpx.AsyncClient() as client_http:
-        response = await client_http.post(
-            url,
-            data=data,
-            auth=(TWILIO_SID, TWILIO_TOKEN)
-        )
-
-    return response.json()
+    """Queue a reply; background workers deliver it (services/outbound_queue.py)."""
+    return await outbound_queue.enqueue(to, message)
 
 
 def build_confirmation_message(parsed: dict, shop_name: str) -> str:
@@ -77,48 +47,76 @@ def build_confirmation_message(parsed: dict, shop_name: str) -> str:
     return "\n".join(lines)
 
 
+def build_shortfall_message(shortfalls: list, shop_name: str) -> str:
+    lines = [f"😔 *{shop_name}* — Sorry, we don't have enough of:\n"]
+    for s in shortfalls:
+        lines.append(f"❌ {s['product_name']} — asked {s['requested']}, available {s['available']}")
+    lines.append("\nPlease send your order again with the available quantities.")
+    return "\n".join(lines)
+
+
 @router.post("/webhook")
 async def whatsapp_webhook(request: Request):
-    db = get_db()
     form = await request.form()
 
     from_number = form.get("From", "").replace("whatsapp:", "")
     body = form.get("Body", "").strip()
     to_number = form.get("To", "").replace("whatsapp:", "")
 
+    message_sid = form.get("MessageSid", "")
+
     if not body:
         return {"status": "empty_message"}
 
-    # ✅ Log message
-    await db.whatsapp_messages.insert_one({
-        "from": from_number,
-        "to": to_number,
-        "body": body,
-        "direction": "inbound",
-        "timestamp": datetime.utcnow(),
-    })
-
-    # ✅ Find shop
-    shop = await db.shops.find_one({"whatsapp_number": to_number})
-    if not shop:
-        shop = await db.shops.find_one({"phone": to_number})
+    # 🔁 Twilio redelivery: hand back the first delivery's result
+    if message_sid:
+        previous = await idempotency.claim(message_sid)
+        if previous is not None:
+            return previous
+
+    try:
+        # ✅ Log message (the raw message is durable before anything else runs)
+        message = await inbound_worker.record_inbound(
+            from_number, to_number, body, message_sid=message_sid or None
+        )
+
+        # ⚡ Ack-fast mode: answer Twilio now, process on the worker pool
+        if inbound_worker.WEBHOOK_ASYNC and inbound_worker.dispatcher.submit(message):
+            result = {"status": "accepted"}
+        else:
+            result = await inbound_worker.process(message, handle_inbound_message)
+    except Exception:
+        if message_sid:
+            await idempotency.release(message_sid)
+        raise
+
+    if message_sid:
+        await idempotency.complete(message_sid, result)
+    return result
+
+
+async def handle_inbound_message(message: dict) -> dict:
+    """Shop lookup, confirm / parse pipeline and reply for one inbound message."""
+    from_number = message["from"]
+    to_number = message["to"]
+    body = message["body"]
+
+    # ✅ Find shop (in-memory routing table, services/shop_router.py)
+    shop = await shop_router.resolve(to_number)
 
     if not shop:
         await send_whatsapp_reply(from_number, "Shop not found. Please contact support.")
         return {"status": "shop_not_found"}
 
-    shop_id = str(shop["_id"])
+    shop_id = shop["id"]
     shop_name = shop["name"]
 
     # 🔥 SMART CONFIRM (FIXED + IMPROVED)
     confirm_words = ["confirm", "yes", "ok", "okay", "haan", "ha", "han", "kar do", "place order", "done"]
 
     if any(word in body.lower() for word in confirm_words):
-        session = await db.whatsapp_sessions.find_one({
-            "customer_phone": from_number,
-            "shop_id": shop_id,
-            "status": "pending"
-        }, sort=[("created_at", -1)])
+        # Claiming the session means a concurrent CONFIRM finds nothing pending
+        session = await session_store.claim(shop_id, from_number)
 
         if not session:
             await send_whatsapp_reply(from_number, "No pending order found. Send your order first!")
@@ -136,50 +134,25 @@ async def whatsapp_webhook(request: Request):
             "created_at": datetime.utcnow(),
         }
 
-        await db.orders.insert_one(order_doc)
-
-        # Update stock
-        for item in session["confirmed_items"]:
-            if item.get("product_id"):
-                await db.products.update_one(
-                    {"_id": ObjectId(item["product_id"])},
-                    {
-                        "$inc": {"stock": -item["quantity"]},
-                        "$set": {"updated_at": datetime.utcnow()}
-                    }
-                )
-
-        await db.whatsapp_sessions.update_one(
-            {"_id": session["_id"]},
-            {"$set": {"status": "completed"}}
-        )
+        try:
+            # One guarded bulk stock update + order insert (services/inventory.py)
+            await inventory.commit_order(order_doc)
+        except inventory.StockShortfall as e:
+            await session_store.complete(session)
+            await send_whatsapp_reply(from_number, build_shortfall_message(e.shortfalls, shop_name))
+            return {"status": "insufficient_stock", "shortfalls": e.shortfalls}
+        except Exception:
+            await session_store.release(session)
+            raise
+
+        await session_store.complete(session)
 
         reply = f"🎉 *Order Confirmed!*\nThank you! Your order of Rs.{session['total']:.2f} has been placed.\n\nShop: {shop_name}"
         await send_whatsapp_reply(from_number, reply)
 
         return {"status": "order_created"}
 
-    # 🤖 Gemini AI reply
-    ai_reply = None
-    if gemini_model:
-        try:
-            prompt = f"""
-You are a smart shop assistant in India.
-
-Understand Hindi, Hinglish, and English.
-
-Customer message:
-{body}
-
-If it's an order → understand items.
-If it's casual → reply naturally.
-"""
-            response = gemini_model.generate_content(prompt)
-            ai_reply = response.text.strip() if response.text else None
-        except Exception as e:
-            print("Gemini AI error:", e)
-
-    # ✅ Parse order
+    # ✅ Parse order (calls Gemini only if the rule-based parser finds nothing)
     parsed = await parse_order(body, shop_id)
 
     confirmed_items = []
@@ -198,27 +171,13 @@ If it's casual → reply naturally.
             })
 
     # ✅ Store session
-    await db.whatsapp_sessions.delete_many({
-        "customer_phone": from_number,
-        "shop_id": shop_id
-    })
-
-    await db.whatsapp_sessions.insert_one({
-        "customer_phone": from_number,
-        "shop_id": shop_id,
-        "raw_message": body,
-        "parsed_items": parsed["items"],
-        "confirmed_items": confirmed_items,
-        "total": total,
-        "status": "pending",
-        "created_at": datetime.utcnow(),
-    })
+    await session_store.save_pending(shop_id, from_number, body, parsed["items"], confirmed_items, total)
 
     # ✅ Reply
     reply = build_confirmation_message(parsed, shop_name)
 
-    if not parsed["items"] and ai_reply:
-        reply = ai_reply
+    if not parsed["items"] and parsed["reply"]:
+        reply = parsed["reply"]
 
     await send_whatsapp_reply(from_number, reply)
 
@@ -228,7 +187,7 @@ If it's casual → reply naturally.
 @router.post("/send")
 async def send_message(msg: WhatsAppMessage):
     result = await send_whatsapp_reply(msg.customer_phone, msg.message)
-    return {"status": "sent", "result": result}
+    return {"status": "queued", "result": result}
 
 
 @router.post("/parse-order")
@@ -237,6 +196,59 @@ async def parse_order_api(shop_id: str = Query(...), message: str = Query(...)):
     return parsed
 
 
+def read_batch_messages(raw: bytes) -> list:
+    """Accept a JSON array or NDJSON; each entry is a string or {"message", "id"}."""
+    text = raw.decode("utf-8").strip()
+    if not text:
+        return []
+    if text.startswith("["):
+        try:
+            entries = json.loads(text)
+        except ValueError as e:
+            raise HTTPException(400, f"Invalid JSON array: {e}")
+    else:
+        entries = []
+        for n, line in enumerate(text.splitlines(), 1):
+            if not line.strip():
+                continue
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                raise HTTPException(400, f"Invalid JSON on line {n}")
+
+    messages = []
+    for entry in entries:
+        if isinstance(entry, str):
+            messages.append({"message": entry})
+        elif isinstance(entry, dict) and isinstance(entry.get("message"), str):
+            messages.append(entry)
+        else:
+            raise HTTPException(400, "Each entry must be a string or an object with a 'message' field")
+    return messages
+
+
+@router.post("/parse-order/batch")
+async def parse_order_batch(
+    request: Request,
+    shop_id: str = Query(...),
+    use_llm: bool = Query(False, description="Send rule-parser misses to the LLM"),
+):
+    """Parse many messages for one shop; results stream back as NDJSON in input order."""
+    entries = read_batch_messages(await request.body())
+
+    async def results():
+        texts = [e["message"] for e in entries]
+        index = 0
+        async for parsed in parse_orders_stream(texts, shop_id, use_llm):
+            line = {"index": index, **parsed}
+            if "id" in entries[index]:
+                line["id"] = entries[index]["id"]
+            yield json.dumps(line, ensure_ascii=False) + "\n"
+            index += 1
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+
 @router.post("/simulate")
 async def simulate_whatsapp(body: WhatsAppMessage):
     db = get_db()
@@ -248,15 +260,15 @@ async def simulate_whatsapp(body: WhatsAppMessage):
     confirm_words = ["confirm", "yes", "ok", "okay", "haan", "ha", "han", "kar do", "place order", "done"]
 
     if any(word in body.message.lower() for word in confirm_words):
-        session = await db.whatsapp_sessions.find_one({
-            "customer_phone": body.customer_phone,
-            "shop_id": body.shop_id,
-            "status": "pending"
-        }, sort=[("created_at", -1)])
+        session = await session_store.claim(body.shop_id, body.customer_phone)
 
         print("SESSION:", session)
 
-        if not session or not session.get("confirmed_items"):
+        if session and not session.get("confirmed_items"):
+            await session_store.release(session)
+            session = None
+
+        if not session:
             return {
                 "reply_preview": "No valid items to order.",
                 "status": "no_items"
@@ -275,24 +287,23 @@ async def simulate_whatsapp(body: WhatsAppMessage):
             "created_at": datetime.utcnow(),
        }
 
-        result = await db.orders.insert_one(order_doc)
-
-        print("ORDER CREATED:", result.inserted_id)
-        # ✅ STOCK UPDATE
-        for item in session["confirmed_items"]:
-            if item.get("product_id"):
-                await db.products.update_one(
-                    {"_id": ObjectId(item["product_id"])},
-                    {
-                        "$inc": {"stock": -item["quantity"]},
-                        "$set": {"updated_at": datetime.utcnow()}
-                   }
-            )
-        # ✅ UPDATE SESSION
-        await db.whatsapp_sessions.update_one(
-            {"_id": session["_id"]},
-            {"$set": {"status": "completed"}}
-        )
+        try:
+            # ✅ STOCK UPDATE + ORDER (one guarded bulk write)
+            await inventory.commit_order(order_doc)
+            print("ORDER CREATED:", order_doc["_id"])
+        except inventory.StockShortfall as e:
+            await session_store.complete(session)
+            return {
+                "reply_preview": build_shortfall_message(e.shortfalls, shop_name),
+                "status": "insufficient_stock",
+                "shortfalls": e.shortfalls,
+            }
+        except Exception:
+            await session_store.release(session)
+            raise
+
+        # ✅ CLOSE SESSION
+        await session_store.complete(session)
 
         return {
             "reply_preview": f"🎉 Order Confirmed! Total: Rs.{session['total']:.2f}",
@@ -318,21 +329,9 @@ async def simulate_whatsapp(body: WhatsAppMessage):
             })
 
     # 🔥 SAVE SESSION (this was missing)
-    await db.whatsapp_sessions.delete_many({
-        "customer_phone": body.customer_phone,
-        "shop_id": body.shop_id
-    })
-
-    await db.whatsapp_sessions.insert_one({
-        "customer_phone": body.customer_phone,
-        "shop_id": body.shop_id,
-        "raw_message": body.message,
-        "parsed_items": parsed["items"],
-        "confirmed_items": confirmed_items,
-        "total": total,
-        "status": "pending",
-        "created_at": datetime.utcnow(),
-    })
+    await session_store.save_pending(
+        body.shop_id, body.customer_phone, body.message, parsed["items"], confirmed_items, total
+    )
 
     reply = build_confirmation_message(parsed, shop_name)
 
@@ -5,35 +5,17 @@ into structured order data. Uses rule-based parsing first, LLM as fallback.
 import re
 import os
 import json
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
 from typing import List
-from database.connection import get_db
-import google.generativeai as genai  # ✅ Gemini
-
-# ✅ Gemini setup
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
-    gemini_model = genai.GenerativeModel("gemini-1.5-flash")
-else:
-    gemini_model = None
-
-
-# 🔥 NEW: Multilingual synonyms (VERY IMPORTANT)
-SYNONYMS = {
-    "doodh": "milk",
-    "milk": "milk",
-    "anda": "eggs",
-    "egg": "eggs",
-    "eggs": "eggs",
-    "bread": "bread",
-    "double roti": "bread",
-    "roti": "bread",
-    "atta": "flour",
-    "chawal": "rice",
-    "paani": "water",
-    "biscuit": "biscuits",
-    "chips": "chips",
-}
+from services.catalog_index import get_catalog
+from services import llm_gateway, parse_cache
+from services.llm_batcher import LLMBatcher
+from services.normalizer import GLOBAL_NORMALIZER, Normalizer, get_normalizer
+
+
+# Minimum confidence for a parsed item to be linked to a catalog product
+MATCH_THRESHOLD = 0.4
 
 
 # Common quantity words
@@ -55,11 +37,17 @@ def parse_number(token: str) -> float | None:
         return None
 
 
-def rule_based_parse(message: str) -> List[dict]:
-    msg = message.strip().lower()
-    msg = re.sub(r'\b(and|aur|bhi|please|bhaiya|ji)\b', '', msg)
-    msg = re.sub(r'[,;]+', ' ', msg)
-    msg = re.sub(r'\s+', ' ', msg).strip()
+def normalize_message(message: str) -> str:
+    """Lower-case, drop filler words and separators, map global synonyms.
+
+    Shop-independent on purpose: this is also the LLM parse cache key.
+    """
+    return GLOBAL_NORMALIZER.normalize(message)
+
+
+def rule_based_parse(message: str, normalizer: Normalizer = GLOBAL_NORMALIZER) -> List[dict]:
+    # Fillers only: item names stay as typed, synonyms are applied in match_products
+    msg = normalizer.clean(message)
 
     items = []
     tokens = msg.split()
@@ -101,42 +89,58 @@ def rule_based_parse(message: str) -> List[dict]:
     return items
 
 
+def score_product(item_name: str, p_name: str) -> float:
+    score = 0.0
+    # Whole words only: "oil" is part of "mustard oil", not of "foil"
+    padded_item, padded_name = f" {item_name} ", f" {p_name} "
+    if padded_item in padded_name or padded_name in padded_item:
+        score = len(item_name) / max(len(p_name), len(item_name))
+
+    item_words = set(item_name.split())
+    prod_words = set(p_name.split())
+    overlap = len(item_words & prod_words)
+    if overlap > 0:
+        score = max(score, overlap / max(len(item_words), len(prod_words)) * 0.8)
+    return score
+
+
 async def match_products(parsed_items: List[dict], shop_id: str) -> List[dict]:
-    db = get_db()
-    products = await db.products.find({"shop_id": shop_id, "active": True}).to_list(500)
+    catalog = await get_catalog(shop_id)
+    normalizer = await get_normalizer(shop_id)
+
+    # The name as typed is tried first, so "aashirvaad atta" still hits the
+    # product of that exact name; the synonym form ("aashirvaad flour") is
+    # then scored alongside it and the better of the two wins.
+    raw = [normalizer.clean(item["name"]) or item["name"].lower() for item in parsed_items]
+    names = [normalizer.normalize(name) or name for name in raw]
+
+    exact = [catalog.exact(raw[i]) or catalog.exact(names[i]) for i in range(len(parsed_items))]
+    unresolved = [i for i, hit in enumerate(exact) if not hit]
+    # One batched trigram scoring pass for every form of every item without an exact hit
+    forms = {i: list(dict.fromkeys([raw[i], names[i]])) for i in unresolved}
+    queries = [form for i in unresolved for form in forms[i]]
+    ranked = iter(catalog.fuzzy(queries))
+    fuzzy = {i: [next(ranked) for _ in forms[i]] for i in unresolved}
 
     matched = []
-    for item in parsed_items:
-        item_name = item["name"].lower()
-
-        # 🔥 NEW: apply synonym normalization
-        item_name = SYNONYMS.get(item_name, item_name)
-
-        best_match = None
-        best_score = 0
-
-        for product in products:
-            p_name = product["name"].lower()
-
-            if item_name == p_name:
-                best_match = product
-                best_score = 1.0
-                break
-
-            if item_name in p_name or p_name in item_name:
-                score = len(item_name) / max(len(p_name), len(item_name))
-                if score > best_score:
-                    best_score = score
-                    best_match = product
-
-            item_words = set(item_name.split())
-            prod_words = set(p_name.split())
-            overlap = len(item_words & prod_words)
-            if overlap > 0:
-                score = overlap / max(len(item_words), len(prod_words)) * 0.8
-                if score > best_score:
-                    best_score = score
-                    best_match = product
+    for i, item in enumerate(parsed_items):
+        best_match = exact[i]
+        best_score = 1.0 if best_match else 0
+
+        if not best_match:
+            for item_name, hits in zip(forms[i], fuzzy[i]):
+                scores = {p["_id"]: s for p, s in hits}
+                candidates = catalog.candidates(item_name)
+                seen = {p["_id"] for p in candidates}
+                candidates += [p for p, _ in hits if p["_id"] not in seen]
+                for product in candidates:
+                    score = max(
+                        score_product(item_name, product["name"].lower()),
+                        scores.get(product["_id"], 0),
+                    )
+                    if score > best_score:
+                        best_score = score
+                        best_match = product
 
         result = {
             "name": item["name"],
@@ -147,7 +151,7 @@ async def match_products(parsed_items: List[dict], shop_id: str) -> List[dict]:
             "unit_price": None,
         }
 
-        if best_match and best_score >= 0.4:
+        if best_match and best_score >= MATCH_THRESHOLD:
             result["matched_product_id"] = str(best_match["_id"])
             result["matched_product_name"] = best_match["name"]
             result["unit_price"] = best_match["price"]
@@ -157,12 +161,42 @@ async def match_products(parsed_items: List[dict], shop_id: str) -> List[dict]:
     return matched
 
 
-# 🔥 UPGRADED Gemini parsing (VERY IMPORTANT)
-async def llm_parse(message: str) -> List[dict]:
-    if not gemini_model:
-        return []
+# Messages parsed and LLM calls spent on them, for /api/admin/metrics
+PARSE_STATS = {"messages": 0, "llm_calls": 0, "by_llm_calls": {}}
 
-    prompt = f"""
+
+def record_parse(llm_calls: int):
+    PARSE_STATS["messages"] += 1
+    PARSE_STATS["llm_calls"] += llm_calls
+    bucket = PARSE_STATS["by_llm_calls"]
+    bucket[llm_calls] = bucket.get(llm_calls, 0) + 1
+
+
+def parse_stats() -> dict:
+    messages = PARSE_STATS["messages"]
+    return {
+        **PARSE_STATS,
+        "llm_calls_per_message": round(PARSE_STATS["llm_calls"] / messages, 3) if messages else 0,
+    }
+
+
+def clean_llm_items(items) -> List[dict]:
+    cleaned = []
+    for item in items if isinstance(items, list) else []:
+        if not isinstance(item, dict) or not item.get("name"):
+            continue
+        try:
+            qty = float(item.get("quantity") or 1)
+        except (TypeError, ValueError):
+            qty = 1
+        cleaned.append({
+            "name": str(item["name"]),
+            "quantity": int(qty) if qty == int(qty) else qty,
+        })
+    return cleaned
+
+
+LLM_INSTRUCTIONS = """
 You are an AI assistant for a small shop in India.
 
 Understand ANY type of message:
@@ -172,60 +206,227 @@ Understand ANY type of message:
 - Mixed language
 - Spelling mistakes
 - Slang
+"""
 
-Message:
-"{message}"
-
-Return ONLY JSON:
-[{{"name": "milk", "quantity": 2}}]
-
+LLM_RULES = """
 Rules:
 - "doodh" → milk
 - "anda" → eggs
 - "double roti" → bread
 - Default quantity = 1
 - Ignore words like "bhaiya", "please"
-- If no items → return []
+- If no items → "items": []
+- "reply": if the message is NOT an order (greeting, question, chit-chat),
+  a short friendly reply in the customer's language. Otherwise "".
 """
 
-    try:
-        response = gemini_model.generate_content(prompt)
-        text = response.text.strip() if response.text else ""
 
-        text = text.replace("```json", "").replace("```", "").strip()
+def load_llm_json(text: str):
+    text = text.replace("```json", "").replace("```", "").strip()
+    return json.loads(text)
+
+
+def clean_llm_result(data) -> dict:
+    if isinstance(data, list):
+        return {"items": clean_llm_items(data), "reply": None}
+    if not isinstance(data, dict):
+        return {"items": [], "reply": None}
+    return {"items": clean_llm_items(data.get("items")), "reply": data.get("reply") or None}
+
+
+# 🔥 UPGRADED Gemini parsing (VERY IMPORTANT)
+async def llm_parse(message: str) -> dict | None:
+    """One Gemini call that returns both the order items and a chat reply.
+
+    Returns None when the model is unavailable or the call failed, so failures
+    are never cached.
+    """
+    if not llm_gateway.gateway.available:
+        return None
 
-        return json.loads(text)
+    prompt = f"""{LLM_INSTRUCTIONS}
+Message:
+"{message}"
+
+Return ONLY JSON:
+{{"items": [{{"name": "milk", "quantity": 2}}], "reply": ""}}
+{LLM_RULES}"""
+
+    text = await llm_gateway.generate(prompt)
+    if text is None:
+        return None
+
+    try:
+        return clean_llm_result(load_llm_json(text))
 
     except Exception as e:
         print(f"Gemini parse failed: {e}")
-        return []
+        return None
 
 
-async def parse_order(message: str, shop_id: str) -> dict:
-    parsed = rule_based_parse(message)
-    method = "rule_based"
+async def llm_parse_batch(messages: List[str]) -> List[dict] | None:
+    """Parse several messages with one Gemini call (numbered list in, JSON array out)."""
+    numbered = "\n".join(f"{i}. {json.dumps(m, ensure_ascii=False)}" for i, m in enumerate(messages, 1))
+    prompt = f"""{LLM_INSTRUCTIONS}
+Messages (each one is from a different customer):
+{numbered}
 
-    # 🔥 IMPROVED fallback trigger
-    if not parsed or len(parsed) == 0:
-        parsed = await llm_parse(message)
-        method = "llm"
+Return ONLY a JSON array with exactly {len(messages)} objects, one per message, in the same order:
+[{{"items": [{{"name": "milk", "quantity": 2}}], "reply": ""}}]
+{LLM_RULES}"""
 
-    if parsed and shop_id:
-        matched = await match_products(parsed, shop_id)
-    else:
-        matched = [{
-            "name": p["name"],
-            "quantity": p["quantity"],
-            "confidence": 1.0,
-            "matched_product_id": None,
-            "matched_product_name": None,
-            "unit_price": None
-        } for p in parsed]
+    text = await llm_gateway.generate(prompt)
+    if text is None:
+        return None
+
+    try:
+        data = load_llm_json(text)
+    except Exception as e:
+        print(f"Gemini batch parse failed: {e}")
+        return None
 
+    if not isinstance(data, list) or len(data) != len(messages):
+        return None
+    return [clean_llm_result(d) for d in data]
+
+
+# Optional micro-batching of concurrent LLM parses (LLM_BATCHING=1)
+batcher = LLMBatcher(
+    llm_parse_batch,
+    llm_parse,
+    max_batch=int(os.getenv("LLM_BATCH_MAX_SIZE", "8")),
+    max_wait_ms=float(os.getenv("LLM_BATCH_MAX_WAIT_MS", "15")),
+) if os.getenv("LLM_BATCHING", "0") == "1" else None
+
+
+async def llm_parse_batched(message: str) -> dict | None:
+    if batcher:
+        return await batcher.submit(message)
+    return await llm_parse(message)
+
+
+async def llm_fallback(message: str) -> tuple:
+    """Cached (then optionally batched) LLM parse. Returns (items, reply, llm_calls)."""
+    key = normalize_message(message)
+    result = await parse_cache.get(key)
+    llm_calls = 0
+    if result is None:
+        result = await llm_parse_batched(message)
+        llm_calls = 1
+        if result is not None:
+            await parse_cache.put(key, result)
+    if not result:
+        return [], None, llm_calls
+    return result["items"], result["reply"], llm_calls
+
+
+def unmatched_items(parsed: List[dict]) -> List[dict]:
+    return [{
+        "name": p["name"],
+        "quantity": p["quantity"],
+        "confidence": 1.0,
+        "matched_product_id": None,
+        "matched_product_name": None,
+        "unit_price": None
+    } for p in parsed]
+
+
+def build_parse_result(message: str, matched: List[dict], method: str, reply, llm_calls: int) -> dict:
     return {
         "items": matched,
         "raw_message": message,
         "parse_method": method,
         "total_items": len(matched),
         "fully_matched": all(m["matched_product_id"] is not None for m in matched),
-    }
\ No newline at end of file
+        "reply": reply,
+        "llm_calls": llm_calls,
+    }
+
+
+async def parse_order(message: str, shop_id: str) -> dict:
+    parsed = rule_based_parse(message, await get_normalizer(shop_id))
+    method = "rule_based"
+    reply = None
+    llm_calls = 0
+
+    # LLM only when the rules found nothing; one call covers items and reply
+    if not parsed and llm_gateway.gateway.available:
+        method = "llm"
+        parsed, reply, llm_calls = await llm_fallback(message)
+
+    record_parse(llm_calls)
+
+    if parsed and shop_id:
+        matched = await match_products(parsed, shop_id)
+    else:
+        matched = unmatched_items(parsed)
+
+    return build_parse_result(message, matched, method, reply, llm_calls)
+
+
+# ── Bulk parsing (backfills, replaying traffic) ──────────────────────────────
+
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", "0")) or os.cpu_count() or 1
+BATCH_CHUNK_SIZE = int(os.getenv("PARSE_BATCH_CHUNK_SIZE", "250"))
+
+_parse_pool = None
+
+
+def _rule_parse_chunk(normalizer: Normalizer, messages: List[str]) -> List[List[dict]]:
+    return [rule_based_parse(m, normalizer) for m in messages]
+
+
+def get_parse_pool():
+    global _parse_pool
+    if _parse_pool is None:
+        _parse_pool = ProcessPoolExecutor(max_workers=PARSE_WORKERS)
+    return _parse_pool
+
+
+def shutdown_parse_pool():
+    global _parse_pool
+    if _parse_pool is not None:
+        _parse_pool.shutdown(cancel_futures=True)
+        _parse_pool = None
+
+
+async def parse_orders_stream(messages: List[str], shop_id: str, use_llm: bool = False):
+    """Parse many messages for one shop, yielding results in input order.
+
+    Rule-based parsing runs chunk-by-chunk in a process pool; each chunk's
+    items are matched against the shop catalog in a single batched pass.
+    """
+    normalizer = await get_normalizer(shop_id)
+    if shop_id:
+        await get_catalog(shop_id)  # build the product index once up front
+
+    chunks = [messages[i:i + BATCH_CHUNK_SIZE] for i in range(0, len(messages), BATCH_CHUNK_SIZE)]
+    if len(chunks) > 1 and PARSE_WORKERS > 1:
+        loop = asyncio.get_running_loop()
+        pool = get_parse_pool()
+        pending = [loop.run_in_executor(pool, _rule_parse_chunk, normalizer, c) for c in chunks]
+    else:
+        pending = None
+
+    for n, chunk in enumerate(chunks):
+        parsed_chunk = await pending[n] if pending else _rule_parse_chunk(normalizer, chunk)
+
+        methods, replies, calls = [], [], []
+        for i, parsed in enumerate(parsed_chunk):
+            method, reply, llm_calls = "rule_based", None, 0
+            if not parsed and use_llm and llm_gateway.gateway.available:
+                method = "llm"
+                parsed_chunk[i], reply, llm_calls = await llm_fallback(chunk[i])
+            record_parse(llm_calls)
+            methods.append(method)
+            replies.append(reply)
+            calls.append(llm_calls)
+
+        flat = [item for parsed in parsed_chunk for item in parsed]
+        flat_matched = await match_products(flat, shop_id) if flat and shop_id else unmatched_items(flat)
+
+        pos = 0
+        for i, parsed in enumerate(parsed_chunk):
+            matched = flat_matched[pos:pos + len(parsed)]
+            pos += len(parsed)
+            yield build_parse_result(chunk[i], matched, methods[i], replies[i], calls[i])
@@ -0,0 +1,381 @@
+"""
+Bulk catalog import from a streamed CSV or NDJSON upload.
+
+Onboarding used to mean one `POST /api/products/` per SKU, each looking up
+the shop and template and re-reading the product it inserted. `import_catalog`
+reads the request body as it arrives, validates each row against the shop
+template (required attributes, number / select / date types) and upserts in
+`bulk_write` chunks of IMPORT_CHUNK_SIZE, keyed by (shop, barcode) when the
+row has a barcode and (shop, name) otherwise. Bad rows are reported with their
+row number and never abort the rest of the file.
+
+A row only sets the columns it carries, so a price list (name, price)
+re-imported over an existing catalog changes prices and nothing else. Left-out
+columns get their defaults (stock 0, unit "piece", the template's low-stock
+threshold) only when the row creates the product, and price plus required
+attributes are only demanded then. Stock set on an existing product is
+recorded in the stock ledger (reason "import").
+
+CSV columns: name, price, stock, unit, description, low_stock_alert, active,
+barcode, plus any template attribute key (e.g. brand, expiry_date). NDJSON
+rows use the same keys, and may also carry an `attributes` object.
+"""
+import codecs
+import csv
+import json
+import os
+from datetime import date, datetime
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from database.connection import get_db
+from services import inventory, product_search, stock_ledger
+
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "1000"))
+IMPORT_MAX_ERRORS = 1000
+TRUE_WORDS = {"1", "true", "yes", "y"}
+FALSE_WORDS = {"0", "false", "no", "n"}
+
+
+class RowError(ValueError):
+    pass
+
+
+# ── Streaming readers ────────────────────────────────────────────────────────
+
+async def read_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending.rstrip("\r")
+
+
+async def csv_rows(lines: AsyncIterator[str]) -> AsyncIterator[Tuple[int, object]]:
+    """Yield (row number, dict) per record; a quoted field may span lines."""
+    header = None
+    record = []
+    row = 0
+    async for line in lines:
+        record.append(line)
+        text = "\n".join(record)
+        if text.count('"') % 2:
+            continue  # inside a quoted field
+        record = []
+        if not text.strip():
+            continue
+        values = next(csv.reader([text]))
+        if header is None:
+            header = [h.strip().lower() for h in values]
+            continue
+        row += 1
+        yield row, dict(zip(header, values))
+    if record:
+        yield row + 1, RowError("Unterminated quoted field")
+
+
+async def ndjson_rows(lines: AsyncIterator[str]) -> AsyncIterator[Tuple[int, object]]:
+    row = 0
+    async for line in lines:
+        if not line.strip():
+            continue
+        row += 1
+        try:
+            value = json.loads(line)
+        except ValueError:
+            yield row, RowError("Invalid JSON")
+            continue
+        yield row, value if isinstance(value, dict) else RowError("Each line must be a JSON object")
+
+
+# ── Validation ───────────────────────────────────────────────────────────────
+
+def _blank(value) -> bool:
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def _number(value, field: str, integer: bool = False):
+    try:
+        number = int(str(value).strip()) if integer else float(value)
+    except (TypeError, ValueError):
+        raise RowError(f"'{field}' must be {'a whole number' if integer else 'a number'}")
+    if number < 0:
+        raise RowError(f"'{field}' cannot be negative")
+    return number
+
+
+def _bool(value, field: str) -> bool:
+    if isinstance(value, bool):
+        return value
+    word = str(value).strip().lower()
+    if word in TRUE_WORDS:
+        return True
+    if word in FALSE_WORDS:
+        return False
+    raise RowError(f"'{field}' must be true or false")
+
+
+def _attribute(spec: dict, value):
+    key = spec["key"]
+    kind = spec.get("type", "text")
+    if kind == "number":
+        return _number(value, key)
+    if kind == "date":
+        try:
+            return date.fromisoformat(str(value).strip()[:10]).isoformat()
+        except ValueError:
+            raise RowError(f"'{key}' must be a date (YYYY-MM-DD)")
+    value = str(value).strip()
+    if kind == "select" and spec.get("options") and value not in spec["options"]:
+        raise RowError(f"'{key}' must be one of: {', '.join(spec['options'])}")
+    return value
+
+
+def validate_row(row: dict, template: dict) -> Tuple[dict, List[str]]:
+    """Turn an input row into (fields to set, fields a new product would still need).
+
+    Only columns present (and non-blank) in the row are returned, so
+    re-importing a price list leaves stock, unit, description and the
+    other attributes of existing products alone. Raises RowError.
+    """
+    row = {str(k).strip().lower(): v for k, v in row.items()}
+    product = {}
+    missing = []
+
+    name = str(row.get("name") or "").strip()
+    if name:
+        product["name"] = name
+    else:
+        missing.append("name")
+    if _blank(row.get("price")):
+        missing.append("price")
+    else:
+        product["price"] = _number(row["price"], "price")
+    if not _blank(row.get("stock")):
+        product["stock"] = _number(row["stock"], "stock", integer=True)
+    for key in ("unit", "description"):
+        if not _blank(row.get(key)):
+            product[key] = str(row[key]).strip()
+    if not _blank(row.get("low_stock_alert")):
+        product["low_stock_alert"] = _number(row["low_stock_alert"], "low_stock_alert", integer=True)
+    if not _blank(row.get("active")):
+        product["active"] = _bool(row["active"], "active")
+
+    given = dict(row.get("attributes") or {}) if isinstance(row.get("attributes"), dict) else {}
+    attributes = {}
+    for spec in template.get("attributes", []):
+        key = spec["key"]
+        value = given.get(key, row.get(key))
+        if _blank(value):
+            if spec.get("required"):
+                missing.append(key)
+            continue
+        attributes[key] = _attribute(spec, value)
+    barcode = given.get("barcode", row.get("barcode"))
+    if not _blank(barcode):
+        attributes["barcode"] = str(barcode).strip()
+    elif not name:
+        raise RowError("'name' or 'barcode' is required")
+    product["attributes"] = attributes
+    return product, missing
+
+
+def insert_defaults(template: dict) -> dict:
+    """Values a new product gets for the columns its row left out."""
+    return {
+        "stock": 0,
+        "unit": "piece",
+        "description": "",
+        "low_stock_alert": template.get("low_stock_threshold", 5),
+        "active": True,
+    }
+
+
+def merge_rows(earlier: dict, later: dict) -> dict:
+    """Fold two rows for the same product; the later row wins per column."""
+    merged = {**earlier, **later}
+    merged["attributes"] = {**earlier["attributes"], **later["attributes"]}
+    return merged
+
+
+def product_key(shop_id: str, product: dict) -> dict:
+    barcode = product["attributes"].get("barcode")
+    if barcode:
+        return {"shop_id": shop_id, "attributes.barcode": barcode}
+    return {"shop_id": shop_id, "name": product["name"]}
+
+
+# ── Import ───────────────────────────────────────────────────────────────────
+
+class ImportReport:
+    def __init__(self):
+        self.rows = 0
+        self.inserted = 0
+        self.updated = 0
+        self.superseded = 0
+        self.error_count = 0
+        self.errors: List[dict] = []
+
+    def error(self, row: int, message: str):
+        self.error_count += 1
+        if len(self.errors) < IMPORT_MAX_ERRORS:
+            self.errors.append({"row": row, "error": message})
+
+    def as_dict(self) -> dict:
+        return {
+            "rows": self.rows,
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "superseded": self.superseded,
+            "failed": self.error_count,
+            "errors": self.errors,
+        }
+
+
+async def _existing(shop_id: str, products: List[dict]) -> Dict[tuple, dict]:
+    """Products already stored for these rows, by product_key; one indexed query."""
+    db = get_db()
+    barcodes = [p["attributes"]["barcode"] for p in products if p["attributes"].get("barcode")]
+    names = [p["name"] for p in products if not p["attributes"].get("barcode")]
+    clauses = []
+    if barcodes:
+        clauses.append({"attributes.barcode": {"$in": barcodes}})
+    if names:
+        clauses.append({"name": {"$in": names}})
+    found = {}
+    async for doc in db.products.find(
+        {"shop_id": shop_id, "$or": clauses}, {"name": 1, "attributes.brand": 1, "attributes.barcode": 1}
+    ):
+        attributes = doc.get("attributes") or {}
+        if attributes.get("barcode"):
+            found.setdefault(("barcode", attributes["barcode"]), doc)
+        found.setdefault(("name", doc.get("name")), doc)
+    return found
+
+
+def _lookup(found: Dict[tuple, dict], product: dict) -> Optional[dict]:
+    barcode = product["attributes"].get("barcode")
+    return found.get(("barcode", barcode)) if barcode else found.get(("name", product["name"]))
+
+
+async def _flush(
+    shop_id: str, shop_type: str, template: dict, batch: Dict[tuple, tuple], report: ImportReport
+):
+    if not batch:
+        return
+    db = get_db()
+    now = datetime.utcnow()
+    batch_id = str(ObjectId())
+    defaults = insert_defaults(template)
+    found = await _existing(shop_id, [product for _, product, _ in batch.values()])
+    rows = []
+    ops = []
+    restocked = []
+    for row, product, missing in batch.values():
+        existing = _lookup(found, product)
+        if existing is None and missing:
+            report.error(row, f"new product needs: {', '.join(missing)}")
+            continue
+        old = existing or {}
+        old_attributes = old.get("attributes") or {}
+        fields = {k: v for k, v in product.items() if k != "attributes"}
+        fields["search_grams"] = product_search.grams(
+            product.get("name", old.get("name")),
+            {
+                "brand": product["attributes"].get("brand", old_attributes.get("brand")),
+                "barcode": product["attributes"].get("barcode", old_attributes.get("barcode")),
+            },
+        )
+        # Attributes are set key by key, so the stored ones the row leaves out stay
+        attribute_fields = {f"attributes.{k}": v for k, v in product["attributes"].items()}
+        stage = inventory.set_stage({**fields, **attribute_fields, "updated_at": now})["$set"]
+        if not attribute_fields:
+            stage["attributes"] = {"$ifNull": ["$attributes", {"$literal": {}}]}
+        # Left-out columns keep their value, or get the default when the upsert creates the product
+        for key, value in {**defaults, "shop_type": shop_type, "created_at": now}.items():
+            if key not in fields:
+                stage[key] = {"$ifNull": [f"${key}", {"$literal": value}]}
+        if existing is not None and "stock" in fields:
+            stage["last_stock_batch"] = {"id": batch_id, "before": "$stock"}
+            restocked.append(existing["_id"])
+        rows.append(row)
+        ops.append(UpdateOne(product_key(shop_id, product), [{"$set": stage}, inventory.IS_LOW_STAGE], upsert=True))
+    if ops:
+        try:
+            result = await db.products.bulk_write(ops, ordered=False)
+            report.inserted += result.upserted_count
+            report.updated += result.matched_count
+        except BulkWriteError as e:
+            details = e.details
+            report.inserted += details.get("nUpserted", 0)
+            report.updated += details.get("nMatched", 0)
+            for err in details.get("writeErrors", []):
+                report.error(rows[err["index"]], err.get("errmsg", "write failed"))
+    if restocked:
+        await _record_restock(shop_id, restocked, batch_id, now)
+    batch.clear()
+
+
+async def _record_restock(shop_id: str, product_ids: List[ObjectId], batch_id: str, at: datetime):
+    """Ledger movements for stock set on existing products, from the before-stamp."""
+    db = get_db()
+    movements = []
+    async for doc in db.products.find(
+        {"_id": {"$in": product_ids}, "last_stock_batch.id": batch_id}, {"stock": 1, "last_stock_batch": 1}
+    ):
+        before = doc["last_stock_batch"].get("before")
+        if before is not None and doc["stock"] != before:
+            movements.append(stock_ledger.movement(
+                shop_id, str(doc["_id"]), doc["stock"] - before, "import", stock_after=doc["stock"], at=at
+            ))
+    await db.products.update_many(
+        {"_id": {"$in": product_ids}, "last_stock_batch.id": batch_id}, {"$unset": {"last_stock_batch": ""}}
+    )
+    await stock_ledger.record(movements)
+
+
+async def import_catalog(
+    shop_id: str, shop_type: str, template: dict, rows: AsyncIterator[Tuple[int, object]]
+) -> dict:
+    report = ImportReport()
+    # key -> (row number, fields, missing); a later row for the same key is folded into an earlier one
+    batch: Dict[tuple, tuple] = {}
+    async for row, value in rows:
+        report.rows += 1
+        if isinstance(value, Exception):
+            report.error(row, str(value))
+            continue
+        try:
+            product, missing = validate_row(value, template)
+        except RowError as e:
+            report.error(row, str(e))
+            continue
+        key = tuple(sorted(product_key(shop_id, product).items()))
+        if key in batch:
+            report.superseded += 1
+            _, earlier, earlier_missing = batch[key]
+            product = merge_rows(earlier, product)
+            missing = [m for m in earlier_missing if m in missing]
+        batch[key] = (row, product, missing)
+        if len(batch) >= IMPORT_CHUNK_SIZE:
+            await _flush(shop_id, shop_type, template, batch, report)
+    await _flush(shop_id, shop_type, template, batch, report)
+    return report.as_dict()
+
+
+def rows_from(chunks: AsyncIterator[bytes], fmt: str) -> AsyncIterator[Tuple[int, object]]:
+    lines = read_lines(chunks)
+    return ndjson_rows(lines) if fmt == "ndjson" else csv_rows(lines)
+
+
+def detect_format(fmt: Optional[str], content_type: str) -> str:
+    if fmt:
+        return fmt
+    return "ndjson" if "json" in (content_type or "") else "csv"
@@ -0,0 +1,216 @@
+"""
+Per-shop product catalog index used by the order matcher.
+
+Instead of re-reading the catalog from MongoDB on every inbound message, each
+shop's active products are loaded once into an in-process index:
+
+- an exact-name hash map (lower-cased name -> product ids)
+- an inverted token index (word -> product ids)
+- a lazily built trigram matrix for typo-tolerant scoring (services/fuzzy_matcher)
+
+The index is kept current by the product routes (create / update / delete /
+adjust-stock) and shops are held in a bounded LRU so memory stays flat no
+matter how many tenants the process serves. Each uvicorn worker keeps its own
+copy; a shop that is not cached is simply loaded again on next use.
+"""
+import os
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+from database.connection import get_db
+from services.fuzzy_matcher import NgramMatrix, TOP_K
+
+CATALOG_CACHE_SIZE = int(os.getenv("CATALOG_CACHE_SIZE", "1000"))
+
+# Only the fields the matcher and order flows need are kept in memory
+PRODUCT_FIELDS = {"name": 1, "price": 1, "stock": 1, "unit": 1, "active": 1, "shop_id": 1}
+
+
+def tokenize(name: str) -> List[str]:
+    return name.lower().split()
+
+
+class CatalogIndex:
+    """In-memory index over one shop's active products."""
+
+    def __init__(self, shop_id: str, products: Iterable[dict] = ()):
+        self.shop_id = shop_id
+        self.products: Dict[str, dict] = {}
+        self.by_name: Dict[str, List[str]] = {}
+        self.tokens: Dict[str, set] = {}
+        self._order: Dict[str, int] = {}
+        self._next_order = 0
+        self._ngrams: Optional[NgramMatrix] = None
+        self._ngram_ids: List[str] = []
+        for product in products:
+            self.upsert(product)
+
+    def __len__(self):
+        return len(self.products)
+
+    def upsert(self, product: dict):
+        """Add or refresh a product. Inactive products are dropped from the index."""
+        product_id = str(product.get("_id") or product.get("id"))
+        self.remove(product_id, keep_order=True)
+        self._ngrams = None
+        if not product.get("active", True):
+            return
+
+        entry = {
+            "_id": product_id,
+            "name": product["name"],
+            "price": product.get("price"),
+            "stock": product.get("stock"),
+            "unit": product.get("unit"),
+        }
+        self.products[product_id] = entry
+        if product_id not in self._order:
+            self._order[product_id] = self._next_order
+            self._next_order += 1
+
+        name = entry["name"].lower()
+        self.by_name.setdefault(name, []).append(product_id)
+        self.by_name[name].sort(key=self._order.__getitem__)
+        for token in set(tokenize(name)):
+            self.tokens.setdefault(token, set()).add(product_id)
+
+    def remove(self, product_id: str, keep_order: bool = False):
+        entry = self.products.pop(product_id, None)
+        if not keep_order:
+            self._order.pop(product_id, None)
+        if not entry:
+            return
+        self._ngrams = None
+        name = entry["name"].lower()
+        ids = self.by_name.get(name, [])
+        if product_id in ids:
+            ids.remove(product_id)
+        if not ids:
+            self.by_name.pop(name, None)
+        for token in set(tokenize(name)):
+            bucket = self.tokens.get(token)
+            if bucket:
+                bucket.discard(product_id)
+                if not bucket:
+                    del self.tokens[token]
+
+    def set_fields(self, product_id: str, **fields):
+        entry = self.products.get(product_id)
+        if entry:
+            entry.update(fields)
+
+    def exact(self, name: str) -> Optional[dict]:
+        ids = self.by_name.get(name.lower())
+        return self.products[ids[0]] if ids else None
+
+    def candidates(self, name: str) -> List[dict]:
+        """Products sharing at least one word with `name`, in catalog order."""
+        ids = set()
+        for token in tokenize(name):
+            ids |= self.tokens.get(token, set())
+        return [self.products[i] for i in sorted(ids, key=self._order.__getitem__)]
+
+    def all(self) -> List[dict]:
+        return sorted(self.products.values(), key=lambda p: self._order[p["_id"]])
+
+    def fuzzy(self, names: List[str], k: int = TOP_K) -> List[List[tuple]]:
+        """Batched typo-tolerant lookup: per name, up to k (product, score) pairs."""
+        if not names:
+            return []
+        if self._ngrams is None:
+            products = self.all()
+            self._ngram_ids = [p["_id"] for p in products]
+            self._ngrams = NgramMatrix([p["name"] for p in products])
+        return [
+            [(self.products[self._ngram_ids[pos]], score) for pos, score in ranked]
+            for ranked in self._ngrams.top_matches(names, k)
+        ]
+
+
+# ── Process-wide LRU of shop indexes ──────────────────────────────────────────
+
+_catalogs: "OrderedDict[str, CatalogIndex]" = OrderedDict()
+# Bumped on every write so a load racing with a write never caches stale data.
+# Only shops that have been loaded are tracked; eviction drops the entry.
+_generations: Dict[str, int] = {}
+
+
+def _remember(shop_id: str, catalog: CatalogIndex):
+    _catalogs[shop_id] = catalog
+    _catalogs.move_to_end(shop_id)
+    while len(_catalogs) > CATALOG_CACHE_SIZE:
+        evicted, _ = _catalogs.popitem(last=False)
+        _generations.pop(evicted, None)
+
+
+async def load_catalog(shop_id: str) -> CatalogIndex:
+    db = get_db()
+    cursor = db.products.find({"shop_id": shop_id, "active": True}, PRODUCT_FIELDS)
+    return CatalogIndex(shop_id, await cursor.to_list(None))
+
+
+async def get_catalog(shop_id: str) -> CatalogIndex:
+    catalog = _catalogs.get(shop_id)
+    if catalog is not None:
+        _catalogs.move_to_end(shop_id)
+        return catalog
+
+    generation = _generations.setdefault(shop_id, 0)
+    catalog = await load_catalog(shop_id)
+    if _generations.get(shop_id) == generation:
+        _remember(shop_id, catalog)
+    return catalog
+
+
+def cache_catalog(catalog: CatalogIndex):
+    """Seed the LRU with a prebuilt index (benchmarks, bulk jobs)."""
+    _generations[catalog.shop_id] = _generations.get(catalog.shop_id, 0) + 1
+    _remember(catalog.shop_id, catalog)
+
+
+def _touch(shop_id: str) -> Optional[CatalogIndex]:
+    if shop_id in _generations:
+        _generations[shop_id] += 1
+    return _catalogs.get(shop_id)
+
+
+def product_saved(product: dict):
+    """Call after a product is created or updated (full document, with `_id`)."""
+    catalog = _touch(product["shop_id"])
+    if catalog is not None:
+        catalog.upsert(product)
+
+
+def product_deleted(shop_id: str, product_id: str):
+    catalog = _touch(shop_id)
+    if catalog is not None:
+        catalog.remove(product_id)
+
+
+def stock_changed(shop_id: str, product_id: str, stock: int):
+    catalog = _touch(shop_id)
+    if catalog is not None:
+        catalog.set_fields(product_id, stock=stock)
+
+
+def stocks_changed(shop_id: str, stocks: Dict[str, int]):
+    """Batch form of stock_changed (product id -> new stock); one cache touch."""
+    catalog = _touch(shop_id)
+    if catalog is not None:
+        for product_id, stock in stocks.items():
+            catalog.set_fields(product_id, stock=stock)
+
+
+def stock_deducted(shop_id: str, quantities: Dict[str, int]):
+    """Apply committed order quantities (product id -> qty) to the cached stock."""
+    catalog = _touch(shop_id)
+    if catalog is None:
+        return
+    for product_id, quantity in quantities.items():
+        entry = catalog.products.get(product_id)
+        if entry is not None and entry.get("stock") is not None:
+            catalog.set_fields(product_id, stock=entry["stock"] - quantity)
+
+
+def invalidate_shop(shop_id: str):
+    _touch(shop_id)
+    _catalogs.pop(shop_id, None)
@@ -0,0 +1,100 @@
+"""
+Streaming NDJSON / CSV exports.
+
+Exports walk a Motor cursor in batches (EXPORT_BATCH_SIZE documents per
+round trip) and yield encoded chunks of roughly EXPORT_CHUNK_BYTES into a
+`StreamingResponse`, so memory stays flat however many rows a shop has. With
+gzip the chunks are compressed on the fly and sent with
+`Content-Encoding: gzip`.
+"""
+import csv
+import io
+import json
+import os
+import zlib
+from datetime import datetime
+from typing import AsyncIterator, Callable, Iterable, List, Optional
+
+from bson import ObjectId
+from fastapi.responses import StreamingResponse
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+EXPORT_CHUNK_BYTES = 64 * 1024
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _cell(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False, default=_json_default)
+    return "" if value is None else value
+
+
+async def ndjson_chunks(docs: AsyncIterator[dict], transform: Callable[[dict], dict]) -> AsyncIterator[bytes]:
+    buffer = []
+    size = 0
+    async for doc in docs:
+        line = json.dumps(transform(doc), ensure_ascii=False, default=_json_default) + "\n"
+        buffer.append(line)
+        size += len(line)
+        if size >= EXPORT_CHUNK_BYTES:
+            yield "".join(buffer).encode()
+            buffer, size = [], 0
+    if buffer:
+        yield "".join(buffer).encode()
+
+
+async def csv_chunks(
+    docs: AsyncIterator[dict], columns: List[str], transform: Callable[[dict], dict]
+) -> AsyncIterator[bytes]:
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(columns)
+    async for doc in docs:
+        row = transform(doc)
+        writer.writerow([_cell(row.get(c)) for c in columns])
+        if out.tell() >= EXPORT_CHUNK_BYTES:
+            yield out.getvalue().encode()
+            out.seek(0)
+            out.truncate()
+    if out.tell():
+        yield out.getvalue().encode()
+
+
+async def gzip_chunks(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream(
+    docs: AsyncIterator[dict],
+    fmt: str,
+    filename: str,
+    columns: Iterable[str],
+    transform: Optional[Callable[[dict], dict]] = None,
+    gzip: bool = False,
+) -> StreamingResponse:
+    """Build the response; `docs` is typically `collection.find(...).batch_size(EXPORT_BATCH_SIZE)`."""
+    transform = transform or (lambda doc: doc)
+    if fmt == "csv":
+        chunks = csv_chunks(docs, list(columns), transform)
+    else:
+        chunks = ndjson_chunks(docs, transform)
+    headers = {"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'}
+    if gzip:
+        chunks = gzip_chunks(chunks)
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(chunks, media_type=FORMATS[fmt], headers=headers)
@@ -0,0 +1,168 @@
+"""
+Typo-tolerant fuzzy matching: "bred" -> Bread, "miilk" -> Amul Milk.
+
+Each catalog is turned into character trigram sets stored CSR-style in NumPy
+arrays. All parsed items of a message are scored against every product with a
+single sparse-times-dense matrix product (cosine similarity over trigram
+sets). The top few candidates per item are then re-ranked with a bounded
+word-level edit distance, so the expensive check only runs on a handful of
+products whatever the catalog size.
+
+The edit score credits each aligned word with its similarity (1.0 exact,
+0.8 for one edit in five letters) over the longer word count. Short words
+(MIN_EDIT_LENGTH) must match exactly: one letter turns "tea" into "pea" or
+"salt" into "malt", different products rather than typos. An edit score
+only counts when the trigram cosine also supports the candidate
+(EDIT_MIN_COSINE); otherwise the cosine score alone stands. A candidate that
+shares no word with the query, even allowing edits ("oil" vs "Foil"), keeps
+only a reduced cosine score (UNALIGNED_WEIGHT), so shared letters alone never
+make a confident match. Scores are capped at MAX_FUZZY_SCORE, below an
+exact-name hit (1.0).
+"""
+from typing import Dict, List, Sequence
+import numpy as np
+
+NGRAM = 3
+TOP_K = 5
+# Fuzzy scores are discounted so a typo never outranks an exact hit
+COSINE_WEIGHT = 0.9
+UNALIGNED_WEIGHT = 0.6
+MAX_FUZZY_SCORE = 0.9
+# Words this short only match exactly; edits start at this length
+MIN_EDIT_LENGTH = 5
+# Trigram support a candidate needs before its edit score is trusted
+EDIT_MIN_COSINE = 0.25
+
+
+def ngrams(text: str) -> set:
+    grams = set()
+    for word in text.lower().split():
+        padded = f" {word} "
+        if len(padded) <= NGRAM:
+            grams.add(padded)
+            continue
+        for i in range(len(padded) - NGRAM + 1):
+            grams.add(padded[i:i + NGRAM])
+    return grams
+
+
+def bounded_edit_distance(a: str, b: str, max_distance: int) -> int:
+    """Levenshtein distance, giving up (returns max_distance + 1) once it is exceeded."""
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    if len(a) > len(b):
+        a, b = b, a
+    previous = list(range(len(a) + 1))
+    for j, cb in enumerate(b, 1):
+        current = [j] + [0] * len(a)
+        for i, ca in enumerate(a, 1):
+            current[i] = min(
+                previous[i] + 1,
+                current[i - 1] + 1,
+                previous[i - 1] + (ca != cb),
+            )
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous = current
+    return previous[-1]
+
+
+def word_similarity(a: str, b: str) -> float:
+    if a == b:
+        return 1.0
+    if max(len(a), len(b)) < MIN_EDIT_LENGTH:
+        return 0.0
+    max_distance = max(1, max(len(a), len(b)) // 4)
+    distance = bounded_edit_distance(a, b, max_distance)
+    if distance > max_distance:
+        return 0.0
+    return 1 - distance / max(len(a), len(b))
+
+
+def edit_score(item_name: str, product_name: str) -> float:
+    """Best-aligned word similarity over the longer word count; each product word aligns once."""
+    item_words = set(item_name.split())
+    prod_words = set(product_name.split())
+    if not item_words or not prod_words:
+        return 0.0
+    unused = set(prod_words)
+    total = 0.0
+    for word in sorted(item_words, key=len, reverse=True):
+        best = max(unused, key=lambda p: word_similarity(word, p), default=None)
+        similarity = word_similarity(word, best) if best is not None else 0.0
+        if similarity > 0:
+            unused.discard(best)
+            total += similarity
+    return min(MAX_FUZZY_SCORE, total / max(len(item_words), len(prod_words)))
+
+
+class NgramMatrix:
+    """Trigram sets of a product list, laid out CSR-style for batched scoring."""
+
+    def __init__(self, names: Sequence[str]):
+        self.names = [n.lower() for n in names]
+        self.vocab: Dict[str, int] = {}
+        indices: List[int] = []
+        indptr = [0]
+        for name in self.names:
+            for gram in ngrams(name):
+                indices.append(self.vocab.setdefault(gram, len(self.vocab)))
+            indptr.append(len(indices))
+
+        self.indices = np.asarray(indices, dtype=np.int64)
+        lengths = np.diff(np.asarray(indptr, dtype=np.int64))
+        self.rows = np.repeat(np.arange(len(self.names)), lengths)
+        self.norms = np.sqrt(np.maximum(lengths, 1)).astype(np.float32)
+
+    def __len__(self):
+        return len(self.names)
+
+    def cosine(self, queries: Sequence[str]) -> np.ndarray:
+        """(products x queries) cosine similarity matrix for all queries at once."""
+        query_grams = [[self.vocab[g] for g in ngrams(q) if g in self.vocab] for q in queries]
+        query_sizes = np.array([max(len(ngrams(q)), 1) for q in queries], dtype=np.float32)
+        cols = sorted({c for grams in query_grams for c in grams})
+        if not cols or not len(self):
+            return np.zeros((len(self), len(queries)), dtype=np.float32)
+
+        # Project the catalog onto just the trigrams the queries use
+        position = np.full(len(self.vocab), -1, dtype=np.int64)
+        position[cols] = np.arange(len(cols))
+        pos = position[self.indices]
+        keep = pos >= 0
+        catalog = np.zeros((len(self), len(cols)), dtype=np.float32)
+        catalog[self.rows[keep], pos[keep]] = 1.0
+
+        query = np.zeros((len(queries), len(cols)), dtype=np.float32)
+        for q, grams in enumerate(query_grams):
+            query[q, position[grams]] = 1.0
+
+        overlap = catalog @ query.T
+        return overlap / (self.norms[:, None] * np.sqrt(query_sizes)[None, :])
+
+    def top_matches(self, queries: Sequence[str], k: int = TOP_K) -> List[List[tuple]]:
+        """For each query, up to k (product position, fuzzy score) pairs, best first."""
+        if not len(self) or not queries:
+            return [[] for _ in queries]
+        scores = self.cosine(queries)
+        k = min(k, len(self))
+        top = np.argpartition(-scores, k - 1, axis=0)[:k]
+
+        results = []
+        for q, query in enumerate(queries):
+            ranked = []
+            for p in top[:, q]:
+                cosine = float(scores[p, q])
+                if cosine <= 0:
+                    continue
+                edit = edit_score(query, self.names[p])
+                if not edit:
+                    fuzzy = cosine * UNALIGNED_WEIGHT
+                elif cosine >= EDIT_MIN_COSINE:
+                    fuzzy = max(cosine * COSINE_WEIGHT, edit)
+                else:
+                    fuzzy = cosine * COSINE_WEIGHT
+                ranked.append((int(p), fuzzy))
+            ranked.sort(key=lambda r: (-r[1], r[0]))
+            results.append(ranked)
+        return results
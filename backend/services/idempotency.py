@@ -0,0 +1,85 @@
+"""
+Idempotent webhook processing keyed on Twilio's MessageSid.
+
+Twilio redelivers a webhook whenever it does not see a timely 2xx, and each
+redelivery used to run the whole pipeline again: a second log entry, another
+parse (maybe a Gemini call) and, for "CONFIRM", a second order with stock
+decremented twice. Now every MessageSid is claimed once:
+
+- the `processed_messages` collection keyed by the SID (`_id`, so unique),
+  expired by a TTL index (IDEMPOTENCY_TTL_SECONDS)
+- an in-process front cache (IDEMPOTENCY_CACHE_SIZE entries,
+  IDEMPOTENCY_CACHE_SECONDS) so bursty retries cost a dict lookup
+
+A duplicate gets the stored result back; one that arrives while the first
+delivery is still running gets {"status": "processing"}.
+"""
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional
+
+from pymongo.errors import DuplicateKeyError
+from database.connection import get_db
+
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+IDEMPOTENCY_CACHE_SECONDS = int(os.getenv("IDEMPOTENCY_CACHE_SECONDS", "600"))
+
+IN_PROGRESS = {"status": "processing"}
+
+_local: "OrderedDict[str, tuple]" = OrderedDict()
+STATS = {"claimed": 0, "local_hits": 0, "db_hits": 0}
+
+
+def _remember(sid: str, result: dict):
+    _local[sid] = (time.time(), result)
+    _local.move_to_end(sid)
+    while len(_local) > IDEMPOTENCY_CACHE_SIZE:
+        _local.popitem(last=False)
+
+
+async def claim(sid: str) -> Optional[dict]:
+    """Claim a MessageSid. None means "first delivery, process it"; otherwise the stored result."""
+    entry = _local.get(sid)
+    if entry and time.time() - entry[0] < IDEMPOTENCY_CACHE_SECONDS:
+        STATS["local_hits"] += 1
+        return entry[1]
+    _local.pop(sid, None)
+
+    db = get_db()
+    try:
+        await db.processed_messages.insert_one(
+            {"_id": sid, "status": "processing", "created_at": datetime.utcnow()}
+        )
+    except DuplicateKeyError:
+        STATS["db_hits"] += 1
+        doc = await db.processed_messages.find_one({"_id": sid})
+        if doc and doc["status"] == "done":
+            _remember(sid, doc["result"])
+            return doc["result"]
+        return IN_PROGRESS
+
+    STATS["claimed"] += 1
+    _remember(sid, IN_PROGRESS)
+    return None
+
+
+async def complete(sid: str, result: dict):
+    _remember(sid, result)
+    db = get_db()
+    await db.processed_messages.update_one(
+        {"_id": sid},
+        {"$set": {"status": "done", "result": result, "completed_at": datetime.utcnow()}},
+    )
+
+
+async def release(sid: str):
+    """Drop a claim after a failure so Twilio's next retry is processed."""
+    _local.pop(sid, None)
+    db = get_db()
+    await db.processed_messages.delete_one({"_id": sid, "status": "processing"})
+
+
+def stats() -> dict:
+    return {**STATS, "local_entries": len(_local)}
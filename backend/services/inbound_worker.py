@@ -0,0 +1,196 @@
+"""
+Ack-fast inbound WhatsApp processing.
+
+With WEBHOOK_ASYNC=1 the webhook only persists the raw message in
+`whatsapp_messages` (status "received") and answers Twilio straight away, so
+slow parsing or Gemini calls can no longer trigger Twilio's retry storm. The
+parse / confirm pipeline then runs on an in-process worker pool:
+
+- INBOUND_WORKERS lanes; a customer always hashes to the same lane, so one
+  customer's messages are handled strictly in order ("2 milk" before "CONFIRM")
+- on shutdown the dispatcher stops accepting work and drains its lanes
+- `recover()` runs at start and then every INBOUND_SWEEP_SECONDS, re-queueing
+  messages older than the grace period that no live lane holds (left by a
+  drain timeout, a crash or a quick restart)
+- `process()` claims a message (status "processing") before running it, so a
+  message recovered elsewhere is never handled twice
+
+Every processed message is marked "processed" (or "failed") either way, so
+the synchronous path shares the same bookkeeping.
+"""
+import asyncio
+import os
+import zlib
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, List, Optional, Set
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+from database.connection import get_db
+
+WEBHOOK_ASYNC = os.getenv("WEBHOOK_ASYNC", "0") == "1"
+INBOUND_WORKERS = int(os.getenv("INBOUND_WORKERS", "8"))
+# Messages younger than this may still sit in another process's memory queue
+INBOUND_RECOVERY_GRACE_SECONDS = int(os.getenv("INBOUND_RECOVERY_GRACE_SECONDS", "60"))
+INBOUND_SWEEP_SECONDS = float(os.getenv("INBOUND_SWEEP_SECONDS", "30"))
+
+Handler = Callable[[dict], Awaitable[dict]]
+
+
+async def record_inbound(from_number: str, to_number: str, body: str, **extra) -> dict:
+    db = get_db()
+    message = {
+        "from": from_number,
+        "to": to_number,
+        "body": body,
+        "direction": "inbound",
+        "status": "received",
+        "timestamp": datetime.utcnow(),
+        **extra,
+    }
+    await db.whatsapp_messages.insert_one(message)
+    return message
+
+
+async def process(message: dict, handler: Handler) -> dict:
+    """Claim one message, run the pipeline and record the outcome on it."""
+    db = get_db()
+    claim = {"_id": message["_id"], "status": message["status"]}
+    if message["status"] == "recovering":
+        claim["recovered_at"] = message["recovered_at"]
+    claimed = await db.whatsapp_messages.update_one(
+        claim, {"$set": {"status": "processing", "processing_at": datetime.utcnow()}}
+    )
+    if not claimed.modified_count:
+        # Another worker recovered it first
+        return {"status": "duplicate"}
+    try:
+        result = await handler(message)
+    except Exception as e:
+        await db.whatsapp_messages.update_one(
+            {"_id": message["_id"]},
+            {"$set": {"status": "failed", "error": str(e)[:500], "processed_at": datetime.utcnow()}},
+        )
+        raise
+    await db.whatsapp_messages.update_one(
+        {"_id": message["_id"]},
+        {"$set": {"status": "processed", "result_status": result.get("status"), "processed_at": datetime.utcnow()}},
+    )
+    return result
+
+
+class InboundDispatcher:
+    def __init__(self, workers: int = INBOUND_WORKERS):
+        self.worker_count = workers
+        self.handler: Optional[Handler] = None
+        self._lanes: List[asyncio.Queue] = []
+        self._tasks: List[asyncio.Task] = []
+        self._sweeper: Optional[asyncio.Task] = None
+        self._queued: Set[ObjectId] = set()
+        self._accepting = False
+        self.in_flight = 0
+        self.processed = 0
+        self.failed = 0
+
+    def start(self, handler: Handler):
+        if self._tasks:
+            return
+        self.handler = handler
+        self._lanes = [asyncio.Queue() for _ in range(self.worker_count)]
+        self._tasks = [asyncio.create_task(self._worker(lane)) for lane in self._lanes]
+        self._sweeper = asyncio.create_task(self._sweep())
+        self._accepting = True
+
+    def submit(self, message: dict) -> bool:
+        """Queue a persisted message. False when draining; recover() picks it up later."""
+        if not self._accepting:
+            return False
+        lane = zlib.crc32(message["from"].encode()) % len(self._lanes)
+        self._queued.add(message["_id"])
+        self._lanes[lane].put_nowait(message)
+        return True
+
+    async def _worker(self, lane: asyncio.Queue):
+        while True:
+            message = await lane.get()
+            self.in_flight += 1
+            try:
+                await process(message, self.handler)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                print(f"Inbound message {message.get('_id')} failed: {e}")
+            finally:
+                self._queued.discard(message["_id"])
+                self.in_flight -= 1
+                lane.task_done()
+
+    async def _sweep(self):
+        while True:
+            await asyncio.sleep(INBOUND_SWEEP_SECONDS)
+            try:
+                await self.recover()
+            except Exception as e:
+                print(f"Inbound recovery sweep failed: {e}")
+
+    async def recover(self) -> int:
+        """Re-queue stale messages no lane of ours holds (oldest first)."""
+        db = get_db()
+        cutoff = datetime.utcnow() - timedelta(seconds=INBOUND_RECOVERY_GRACE_SECONDS)
+        count = 0
+        while True:
+            # Claim one at a time so two starting processes never share a message
+            message = await db.whatsapp_messages.find_one_and_update(
+                {
+                    "_id": {"$nin": list(self._queued)},
+                    "timestamp": {"$lt": cutoff},
+                    "$or": [
+                        {"status": "received"},
+                        {"status": "recovering", "recovered_at": {"$lt": cutoff}},
+                        {"status": "processing", "processing_at": {"$lt": cutoff}},
+                    ],
+                },
+                {"$set": {"status": "recovering", "recovered_at": datetime.utcnow()}},
+                sort=[("timestamp", 1)],
+                return_document=ReturnDocument.AFTER,
+            )
+            if not message or not self.submit(message):
+                return count
+            count += 1
+
+    async def stop(self, timeout: float = 30):
+        """Stop accepting messages and drain what is already queued."""
+        self._accepting = False
+        if self._sweeper:
+            self._sweeper.cancel()
+            self._sweeper = None
+        if self._lanes:
+            try:
+                await asyncio.wait_for(asyncio.gather(*(lane.join() for lane in self._lanes)), timeout)
+            except asyncio.TimeoutError:
+                print(f"Inbound drain timed out with {self.backlog} message(s) left; the next recovery sweep picks them up")
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        self._lanes = []
+
+    @property
+    def backlog(self) -> int:
+        return sum(lane.qsize() for lane in self._lanes) + self.in_flight
+
+    async def stats(self) -> dict:
+        db = get_db()
+        return {
+            "enabled": WEBHOOK_ASYNC,
+            "workers": len(self._tasks),
+            "backlog": self.backlog,
+            "in_flight": self.in_flight,
+            "processed": self.processed,
+            "failed": self.failed,
+            "unprocessed_in_db": await db.whatsapp_messages.count_documents(
+                {"status": {"$in": ["received", "recovering", "processing"]}}
+            ),
+        }
+
+
+dispatcher = InboundDispatcher()
@@ -0,0 +1,347 @@
+"""
+Shared inventory commit for order confirmation.
+
+The WhatsApp confirm paths and `create_order` used to decrement stock with one
+`update_one` per line, and WhatsApp never checked stock at all. `commit_order`
+applies every line in one `bulk_write` of conditional updates
+(`stock >= qty` in the filter, stock reduced by qty), then inserts the order:
+
+- on a replica set (or mongos) both happen in one multi-document transaction;
+  a shortfall aborts it and nothing is written
+- on a standalone server each update also sets a per-order hold
+  (`stock_holds.<order id>`), so a partial failure can be rolled back exactly
+  and the holds are cleared once the order is stored
+
+Either way a shortfall raises `StockShortfall` listing the short lines, and
+a committed order appends one "order" movement per product to the stock
+ledger (services/stock_ledger.py).
+INVENTORY_TRANSACTIONS=0 forces the standalone path.
+
+`bulk_adjust` applies a stocktake or delivery receipt (deltas or counted
+stock, by product id or barcode) in one `bulk_write` and reports per line.
+
+Stock writes are update pipelines ending in `IS_LOW_STAGE`, which keeps the
+materialized `is_low` flag (stock <= low_stock_alert) in step with the new
+stock; low-stock queries read it through a partial (shop_id, is_low) index.
+"""
+import os
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from bson import ObjectId
+from pymongo import UpdateOne
+from database.connection import get_db, get_client
+from services import catalog_index, stock_ledger
+
+INVENTORY_TRANSACTIONS = os.getenv("INVENTORY_TRANSACTIONS", "auto")
+
+_supports_transactions: Optional[bool] = None
+
+IS_LOW_EXPR = {"$lte": ["$stock", "$low_stock_alert"]}
+IS_LOW_STAGE = {"$set": {"is_low": IS_LOW_EXPR}}
+
+
+def is_low(stock, low_stock_alert) -> bool:
+    return stock is not None and low_stock_alert is not None and stock <= low_stock_alert
+
+
+def set_stage(fields: dict) -> dict:
+    """A pipeline `$set` of plain values ($literal, so "$5 off" stays a string)."""
+    return {"$set": {k: {"$literal": v} for k, v in fields.items()}}
+
+
+class StockShortfall(Exception):
+    """Some lines could not be covered; `shortfalls` has one entry per product."""
+
+    def __init__(self, shortfalls: List[dict]):
+        names = ", ".join(f"{s['product_name']} (available {s['available']})" for s in shortfalls)
+        super().__init__(f"Insufficient stock for {names}")
+        self.shortfalls = shortfalls
+
+
+class _Short(Exception):
+    """Raised inside the transaction to abort it when a line is short."""
+
+
+async def supports_transactions() -> bool:
+    global _supports_transactions
+    if INVENTORY_TRANSACTIONS == "0":
+        return False
+    if _supports_transactions is None:
+        try:
+            hello = await get_client().admin.command("hello")
+            _supports_transactions = "setName" in hello or hello.get("msg") == "isdbgrid"
+        except Exception:
+            _supports_transactions = False
+    return _supports_transactions
+
+
+def _quantities(items: List[dict]) -> "OrderedDict[str, dict]":
+    """Sum quantities per product; lines without a product are not stocked."""
+    lines: "OrderedDict[str, dict]" = OrderedDict()
+    for item in items:
+        product_id = item.get("product_id")
+        if not product_id:
+            continue
+        line = lines.setdefault(product_id, {"product_name": item.get("product_name", ""), "quantity": 0})
+        line["quantity"] += item["quantity"]
+    return lines
+
+
+async def _shortfalls(lines: Dict[str, dict], applied=frozenset()) -> List[dict]:
+    db = get_db()
+    stock = {}
+    async for doc in db.products.find(
+        {"_id": {"$in": [ObjectId(pid) for pid in lines]}}, {"stock": 1}
+    ):
+        stock[str(doc["_id"])] = doc.get("stock", 0)
+    return [
+        {
+            "product_id": pid,
+            "product_name": line["product_name"],
+            "requested": line["quantity"],
+            "available": stock.get(pid, 0),
+        }
+        for pid, line in lines.items()
+        if pid not in applied
+    ]
+
+
+async def commit_order(order_doc: dict) -> dict:
+    """Deduct stock for `order_doc["items"]` and insert the order. Raises StockShortfall."""
+    db = get_db()
+    order_doc.setdefault("_id", ObjectId())
+    lines = _quantities(order_doc["items"])
+    now = datetime.utcnow()
+
+    if not lines:
+        await db.orders.insert_one(order_doc)
+        return order_doc
+
+    if await supports_transactions():
+        ops = [
+            UpdateOne(
+                {"_id": ObjectId(pid), "stock": {"$gte": line["quantity"]}},
+                [
+                    {"$set": {"stock": {"$subtract": ["$stock", line["quantity"]]}, "updated_at": now}},
+                    IS_LOW_STAGE,
+                ],
+            )
+            for pid, line in lines.items()
+        ]
+
+        async def apply(session):
+            result = await db.products.bulk_write(ops, ordered=False, session=session)
+            if result.matched_count < len(ops):
+                raise _Short()
+            await db.orders.insert_one(order_doc, session=session)
+            await stock_ledger.record(_movements(order_doc, lines, now), session=session)
+
+        async with await get_client().start_session() as session:
+            try:
+                # Aborts on any error and retries on TransientTransactionError
+                # (a write conflict with a concurrent order for the same product)
+                await session.with_transaction(apply)
+            except _Short:
+                # Read after the abort: every line is back to its committed stock
+                shortfalls = await _shortfalls(lines)
+                raise StockShortfall(
+                    [s for s in shortfalls if s["available"] < s["requested"]] or shortfalls
+                )
+    else:
+        hold = f"stock_holds.{order_doc['_id']}"
+        ops = [
+            UpdateOne(
+                {"_id": ObjectId(pid), "stock": {"$gte": line["quantity"]}},
+                [
+                    {"$set": {
+                        "stock": {"$subtract": ["$stock", line["quantity"]]},
+                        "updated_at": now,
+                        hold: line["quantity"],
+                    }},
+                    IS_LOW_STAGE,
+                ],
+            )
+            for pid, line in lines.items()
+        ]
+        result = await db.products.bulk_write(ops, ordered=False)
+        try:
+            if result.matched_count < len(ops):
+                applied = {
+                    str(doc["_id"])
+                    async for doc in db.products.find(
+                        {"_id": {"$in": [ObjectId(pid) for pid in lines]}, hold: {"$exists": True}}, {"_id": 1}
+                    )
+                }
+                await _release_holds(lines, applied, hold)
+                raise StockShortfall(await _shortfalls(lines, applied))
+            await db.orders.insert_one(order_doc)
+        except StockShortfall:
+            raise
+        except Exception:
+            await _release_holds(lines, set(lines), hold)
+            raise
+        await db.products.update_many(
+            {"_id": {"$in": [ObjectId(pid) for pid in lines]}}, {"$unset": {hold: ""}}
+        )
+        await _drop_empty_holds(list(lines))
+        await stock_ledger.record(_movements(order_doc, lines, now))
+
+    catalog_index.stock_deducted(
+        order_doc["shop_id"], {pid: line["quantity"] for pid, line in lines.items()}
+    )
+    return order_doc
+
+
+def _movements(order_doc: dict, lines: Dict[str, dict], at: datetime) -> List[dict]:
+    return [
+        stock_ledger.movement(
+            order_doc["shop_id"], pid, -line["quantity"], "order", order_id=str(order_doc["_id"]), at=at
+        )
+        for pid, line in lines.items()
+    ]
+
+
+async def _release_holds(lines: Dict[str, dict], applied, hold: str):
+    """Give back stock taken by this order's holds (standalone rollback)."""
+    if not applied:
+        return
+    db = get_db()
+    await db.products.bulk_write([
+        UpdateOne(
+            {"_id": ObjectId(pid), hold: {"$exists": True}},
+            [
+                {"$set": {"stock": {"$add": ["$stock", lines[pid]["quantity"]]}}},
+                {"$unset": hold},
+                IS_LOW_STAGE,
+            ],
+        )
+        for pid in applied
+    ], ordered=False)
+    await _drop_empty_holds(list(applied))
+
+
+async def _drop_empty_holds(product_ids: List[str]):
+    """Remove `stock_holds` once its last hold is gone (a concurrent order's hold keeps it)."""
+    db = get_db()
+    await db.products.update_many(
+        {"_id": {"$in": [ObjectId(pid) for pid in product_ids]}, "stock_holds": {}},
+        {"$unset": {"stock_holds": ""}},
+    )
+
+
+# ── Bulk adjustments ─────────────────────────────────────────────────────────
+
+def _line_error(line) -> Optional[str]:
+    if bool(line.product_id) == bool(line.barcode):
+        return "give exactly one of product_id or barcode"
+    if (line.delta is None) == (line.count is None):
+        return "give exactly one of delta or count"
+    if line.count is not None and line.count < 0:
+        return "count cannot be negative"
+    return None
+
+
+async def bulk_adjust(shop_id: str, lines: list, reason: str) -> List[dict]:
+    """Apply stock lines in one bulk_write; returns one result per input line.
+
+    Lines for the same product are folded in order (a count resets, deltas
+    add up). Each product update is a pipeline that also stamps
+    `last_stock_batch` ({id, before}), so a single read-back tells which
+    updates applied and by how much, even when some were refused; the stamp
+    is removed again afterwards.
+    """
+    db = get_db()
+    results: List[dict] = [{"line": i} for i in range(len(lines))]
+
+    barcodes = {line.barcode for line in lines if line.barcode and not line.product_id}
+    by_barcode = {}
+    if barcodes:
+        async for doc in db.products.find(
+            {"shop_id": shop_id, "attributes.barcode": {"$in": list(barcodes)}}, {"attributes.barcode": 1}
+        ):
+            by_barcode[doc["attributes"]["barcode"]] = str(doc["_id"])
+
+    # product id -> {"count": int | None, "delta": int, "lines": [index]}
+    plans: "OrderedDict[str, dict]" = OrderedDict()
+    for i, line in enumerate(lines):
+        error = _line_error(line)
+        product_id = line.product_id or by_barcode.get(line.barcode)
+        if not error and not product_id:
+            error = "barcode not found"
+        if not error and not ObjectId.is_valid(product_id):
+            error = "invalid product_id"
+        if error:
+            results[i].update(status="invalid", error=error)
+            continue
+        plan = plans.setdefault(product_id, {"count": None, "delta": 0, "lines": []})
+        if line.count is not None:
+            plan["count"], plan["delta"] = line.count, 0
+        else:
+            plan["delta"] += line.delta
+        plan["lines"].append(i)
+
+    for product_id in [pid for pid, plan in plans.items() if plan["count"] is not None]:
+        plan = plans[product_id]
+        if plan["count"] + plan["delta"] < 0:
+            for i in plans.pop(product_id)["lines"]:
+                results[i].update(status="invalid", error="count plus later deltas is below zero")
+
+    if not plans:
+        return results
+
+    batch_id = str(ObjectId())
+    now = datetime.utcnow()
+    ops = []
+    for product_id, plan in plans.items():
+        query = {"_id": ObjectId(product_id), "shop_id": shop_id}
+        if plan["count"] is not None:
+            new_stock = {"$literal": plan["count"] + plan["delta"]}
+        else:
+            new_stock = {"$add": ["$stock", plan["delta"]]}
+            if plan["delta"] < 0:
+                query["stock"] = {"$gte": -plan["delta"]}
+        ops.append(UpdateOne(query, [
+            {"$set": {
+                "stock": new_stock,
+                "last_stock_batch": {"id": batch_id, "before": "$stock"},
+                "updated_at": now,
+            }},
+            IS_LOW_STAGE,
+        ]))
+    await db.products.bulk_write(ops, ordered=False)
+
+    after = {}
+    async for doc in db.products.find(
+        {"_id": {"$in": [ObjectId(pid) for pid in plans]}, "shop_id": shop_id},
+        {"stock": 1, "last_stock_batch": 1},
+    ):
+        after[str(doc["_id"])] = doc
+    # The stamp has served its purpose; keep it out of product documents
+    await db.products.update_many(
+        {"_id": {"$in": [ObjectId(pid) for pid in plans]}, "last_stock_batch.id": batch_id},
+        {"$unset": {"last_stock_batch": ""}},
+    )
+
+    movements = []
+    stocks = {}
+    for product_id, plan in plans.items():
+        doc = after.get(product_id)
+        if doc is None:
+            outcome = {"product_id": product_id, "status": "not_found"}
+        elif (doc.get("last_stock_batch") or {}).get("id") == batch_id:
+            before = doc["last_stock_batch"]["before"]
+            outcome = {"product_id": product_id, "status": "ok", "old_stock": before, "new_stock": doc["stock"]}
+            stocks[product_id] = doc["stock"]
+            movements.append(stock_ledger.movement(
+                shop_id, product_id, doc["stock"] - before, reason, stock_after=doc["stock"], at=now
+            ))
+        else:
+            outcome = {"product_id": product_id, "status": "insufficient_stock", "stock": doc.get("stock")}
+        for i in plan["lines"]:
+            results[i].update(outcome)
+
+    await stock_ledger.record(movements)
+    catalog_index.stocks_changed(shop_id, stocks)
+    return results
@@ -0,0 +1,99 @@
+"""
+Micro-batching for concurrent LLM requests.
+
+During the morning rush many shops fall back to the LLM at the same moment.
+Instead of one Gemini round trip per message, requests arriving within
+`max_wait_ms` of each other are collected (up to `max_batch` of them) and sent
+as a single prompt; each caller gets back only its own result.
+
+The batcher is prompt-agnostic: the caller supplies how to build the batched
+prompt, how to split the response, and how to handle a single message.
+Identical messages inside one batch are sent once. Dispatch tasks are held
+in `_inflight` (the event loop only keeps weak references to tasks) and
+`drain()` waits for them on shutdown.
+"""
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+
+class LLMBatcher:
+    def __init__(
+        self,
+        run_batch: Callable[[List[str]], Awaitable[Optional[list]]],
+        run_single: Callable[[str], Awaitable[Optional[dict]]],
+        max_batch: int = 8,
+        max_wait_ms: float = 15,
+    ):
+        self.run_batch = run_batch
+        self.run_single = run_single
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._pending: Dict[str, List[asyncio.Future]] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._inflight: Set[asyncio.Task] = set()
+        self.batches = 0
+        self.messages = 0
+        self.fallbacks = 0
+
+    async def submit(self, message: str) -> Optional[dict]:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.setdefault(message, []).append(future)
+        self.messages += 1
+
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        task = asyncio.ensure_future(self._dispatch(batch))
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+
+    async def drain(self, timeout: float = 30):
+        """Send whatever is pending and wait for batches in flight."""
+        self._flush()
+        if self._inflight:
+            done, pending = await asyncio.wait(set(self._inflight), timeout=timeout)
+            for task in pending:
+                task.cancel()
+
+    async def _dispatch(self, batch: Dict[str, List[asyncio.Future]]):
+        messages = list(batch)
+        self.batches += 1
+        try:
+            if len(messages) == 1:
+                results = [await self.run_single(messages[0])]
+            else:
+                results = await self.run_batch(messages)
+                if results is None or len(results) != len(messages):
+                    # Malformed batch answer: fall back to one call per message
+                    self.fallbacks += 1
+                    results = await asyncio.gather(*(self.run_single(m) for m in messages))
+        except Exception as e:
+            print(f"LLM batch failed: {e}")
+            results = [None] * len(messages)
+
+        for message, result in zip(messages, results):
+            for future in batch[message]:
+                if not future.done():
+                    future.set_result(result)
+
+    def stats(self) -> dict:
+        return {
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000,
+            "batches": self.batches,
+            "messages": self.messages,
+            "avg_batch_size": round(self.messages / self.batches, 2) if self.batches else 0,
+            "fallbacks": self.fallbacks,
+            "pending": sum(len(f) for f in self._pending.values()),
+            "in_flight": len(self._inflight),
+        }
@@ -0,0 +1,138 @@
+"""
+Shared async gateway for every Gemini call.
+
+The google-generativeai `generate_content` call is blocking, and calling it
+inside an `async def` handler freezes the event loop for every other shop.
+All LLM traffic goes through `generate()` instead, which:
+
+- uses the SDK's async API when available, otherwise runs the call in a thread
+- caps in-flight requests with a semaphore (LLM_MAX_CONCURRENCY)
+- enforces a hard per-call deadline (LLM_TIMEOUT_SECONDS)
+- keeps queue-depth and latency counters for /api/admin/metrics
+
+`set_model(FakeModel(...))` swaps Gemini for a local stand-in.
+"""
+import asyncio
+import os
+import time
+from typing import Callable, Optional, Union
+
+import google.generativeai as genai
+
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "10"))
+
+
+class FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeModel:
+    """Deterministic stand-in for a Gemini model.
+
+    `reply` is either fixed text or a callable taking the prompt.
+    """
+
+    def __init__(self, reply: Union[str, Callable[[str], str]] = "[]", delay: float = 0.0):
+        self.reply = reply
+        self.delay = delay
+        self.prompts = []
+
+    async def generate_content_async(self, prompt: str) -> FakeResponse:
+        self.prompts.append(prompt)
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        text = self.reply(prompt) if callable(self.reply) else self.reply
+        return FakeResponse(text)
+
+
+class LLMGateway:
+    def __init__(self, model=None, max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 timeout: float = LLM_TIMEOUT_SECONDS):
+        self.model = model
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.max_concurrency = max_concurrency
+        self.waiting = 0
+        self.in_flight = 0
+        self.calls = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    @property
+    def available(self) -> bool:
+        return self.model is not None
+
+    async def _call(self, prompt: str):
+        if hasattr(self.model, "generate_content_async"):
+            return await self.model.generate_content_async(prompt)
+        return await asyncio.to_thread(self.model.generate_content, prompt)
+
+    async def generate(self, prompt: str) -> Optional[str]:
+        """Return the model's text, or None when unavailable, failed or timed out."""
+        if not self.model:
+            return None
+
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.in_flight += 1
+        start = time.perf_counter()
+        try:
+            response = await asyncio.wait_for(self._call(prompt), self.timeout)
+            return response.text.strip() if response.text else ""
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            print(f"Gemini call timed out after {self.timeout}s")
+            return None
+        except Exception as e:
+            self.errors += 1
+            print(f"Gemini call failed: {e}")
+            return None
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            self.calls += 1
+            self.total_ms += elapsed
+            self.max_ms = max(self.max_ms, elapsed)
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "model_configured": self.available,
+            "max_concurrency": self.max_concurrency,
+            "queue_depth": self.waiting,
+            "in_flight": self.in_flight,
+            "calls": self.calls,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "avg_latency_ms": round(self.total_ms / self.calls, 1) if self.calls else 0,
+            "max_latency_ms": round(self.max_ms, 1),
+        }
+
+
+def _default_model():
+    if not GEMINI_API_KEY:
+        return None
+    genai.configure(api_key=GEMINI_API_KEY)
+    return genai.GenerativeModel(GEMINI_MODEL)
+
+
+gateway = LLMGateway(_default_model())
+
+
+def set_model(model):
+    """Swap the underlying model, e.g. for a FakeModel in tests or offline runs."""
+    gateway.model = model
+
+
+async def generate(prompt: str) -> Optional[str]:
+    return await gateway.generate(prompt)
@@ -0,0 +1,232 @@
+"""
+Single-pass message normalizer: synonyms and filler words.
+
+Messages are lower-cased and split into words once, then run through a
+word-level Aho-Corasick automaton holding every synonym phrase ("double roti"
+-> bread) and filler word ("bhaiya" -> nothing). Overlapping hits resolve
+leftmost-longest, so "2 double roti" becomes "2 bread" wherever it appears in
+the message. `clean()` only drops filler words; the parser segments messages
+with it so item names keep the customer's own words, and synonyms are applied
+when matching.
+
+Each shop can keep its own terms in the `shop_synonyms` collection; they are
+merged over the global dictionary below. Shop automatons live in a bounded LRU
+and are patched in place when the shop's dictionary changes.
+"""
+import os
+import re
+from collections import OrderedDict, deque
+from typing import Dict, Iterable, List, Optional, Tuple
+from database.connection import get_db
+
+# 🔥 NEW: Multilingual synonyms (VERY IMPORTANT)
+SYNONYMS = {
+    "doodh": "milk",
+    "milk": "milk",
+    "anda": "eggs",
+    "egg": "eggs",
+    "eggs": "eggs",
+    "bread": "bread",
+    "double roti": "bread",
+    "roti": "bread",
+    "atta": "flour",
+    "chawal": "rice",
+    "paani": "water",
+    "biscuit": "biscuits",
+    "chips": "chips",
+}
+
+FILLER_WORDS = ["and", "aur", "bhi", "please", "bhaiya", "ji"]
+
+NORMALIZER_CACHE_SIZE = int(os.getenv("NORMALIZER_CACHE_SIZE", "1000"))
+
+TOKEN_RE = re.compile(r"[^\s,;]+")
+
+
+class Automaton:
+    """Word-level Aho-Corasick automaton mapping phrases to replacements."""
+
+    def __init__(self, patterns: Optional[Dict[str, str]] = None):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._out: List[Optional[Tuple[int, str]]] = [None]
+        self._fail: List[int] = [0]
+        self._dict_link: List[int] = [0]
+        self._dirty = False
+        for phrase, replacement in (patterns or {}).items():
+            self.add(phrase, replacement)
+
+    def add(self, phrase: str, replacement: str):
+        words = phrase.lower().split()
+        if not words:
+            return
+        node = 0
+        for word in words:
+            nxt = self._goto[node].get(word)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][word] = nxt
+                self._goto.append({})
+                self._out.append(None)
+                self._fail.append(0)
+                self._dict_link.append(0)
+            node = nxt
+        self._out[node] = (len(words), replacement.lower())
+        self._dirty = True
+
+    def remove(self, phrase: str):
+        node = 0
+        for word in phrase.lower().split():
+            node = self._goto[node].get(word)
+            if node is None:
+                return
+        if self._out[node] is not None:
+            self._out[node] = None
+            self._dirty = True
+
+    def _link(self):
+        """Recompute failure and output links (BFS over the existing trie)."""
+        queue = deque()
+        for child in self._goto[0].values():
+            self._fail[child] = 0
+            self._dict_link[child] = 0
+            queue.append(child)
+        while queue:
+            node = queue.popleft()
+            for word, child in self._goto[node].items():
+                fail = self._fail[node]
+                while fail and word not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fail = self._goto[fail].get(word, 0)
+                self._fail[child] = fail
+                self._dict_link[child] = fail if self._out[fail] else self._dict_link[fail]
+                queue.append(child)
+        self._dirty = False
+
+    def replace(self, words: List[str]) -> List[str]:
+        if self._dirty:
+            self._link()
+
+        goto, fail, out, dict_link = self._goto, self._fail, self._out, self._dict_link
+        matches = []
+        node = 0
+        for i, word in enumerate(words):
+            while node and word not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(word, 0)
+            hit = node if out[node] else dict_link[node]
+            while hit:
+                length, replacement = out[hit]
+                matches.append((i - length + 1, i + 1, replacement))
+                hit = dict_link[hit]
+
+        if not matches:
+            return words
+        matches.sort(key=lambda m: (m[0], -m[1]))
+        result, pos = [], 0
+        for start, end, replacement in matches:
+            if start < pos:
+                continue
+            result.extend(words[pos:start])
+            if replacement:
+                result.extend(replacement.split())
+            pos = end
+        result.extend(words[pos:])
+        return result
+
+
+def global_patterns() -> Dict[str, str]:
+    patterns = {word: "" for word in FILLER_WORDS}
+    patterns.update(SYNONYMS)
+    return patterns
+
+
+class Normalizer:
+    def __init__(self, shop_terms: Optional[Dict[str, str]] = None):
+        patterns = global_patterns()
+        patterns.update(shop_terms or {})
+        self.automaton = Automaton(patterns)
+        self.fillers = Automaton({term: "" for term, canonical in patterns.items() if not canonical})
+
+    def normalize(self, message: str) -> str:
+        return " ".join(self.automaton.replace(TOKEN_RE.findall(message.lower())))
+
+    def clean(self, message: str) -> str:
+        """Lower-case and drop filler words, leaving synonyms as typed."""
+        return " ".join(self.fillers.replace(TOKEN_RE.findall(message.lower())))
+
+    def set_term(self, term: str, canonical: str):
+        self.automaton.add(term, canonical)
+        if canonical:
+            self.fillers.remove(term)
+        else:
+            self.fillers.add(term, "")
+
+    def remove_term(self, term: str):
+        # Fall back to the global meaning, if there is one
+        self.automaton.remove(term)
+        self.fillers.remove(term)
+        default = global_patterns().get(term.lower())
+        if default is not None:
+            self.set_term(term, default)
+
+
+GLOBAL_NORMALIZER = Normalizer()
+
+
+# ── Per-shop normalizers ─────────────────────────────────────────────────────
+
+_normalizers: "OrderedDict[str, Normalizer]" = OrderedDict()
+_generations: Dict[str, int] = {}
+
+
+async def load_shop_terms(shop_id: str) -> Dict[str, str]:
+    db = get_db()
+    docs = await db.shop_synonyms.find({"shop_id": shop_id}, {"term": 1, "canonical": 1}).to_list(None)
+    return {d["term"]: d["canonical"] for d in docs}
+
+
+async def get_normalizer(shop_id: Optional[str]) -> Normalizer:
+    if not shop_id:
+        return GLOBAL_NORMALIZER
+    normalizer = _normalizers.get(shop_id)
+    if normalizer is not None:
+        _normalizers.move_to_end(shop_id)
+        return normalizer
+
+    generation = _generations.setdefault(shop_id, 0)
+    terms = await load_shop_terms(shop_id)
+    normalizer = Normalizer(terms) if terms else GLOBAL_NORMALIZER
+    if _generations.get(shop_id) == generation:
+        _normalizers[shop_id] = normalizer
+        while len(_normalizers) > NORMALIZER_CACHE_SIZE:
+            evicted, _ = _normalizers.popitem(last=False)
+            _generations.pop(evicted, None)
+    return normalizer
+
+
+def cache_normalizer(shop_id: str, normalizer: Normalizer):
+    """Seed the LRU with a prebuilt normalizer (benchmarks, bulk jobs)."""
+    _generations[shop_id] = _generations.get(shop_id, 0) + 1
+    _normalizers[shop_id] = normalizer
+
+
+def terms_changed(shop_id: str, added: Dict[str, str] = None, removed: Iterable[str] = ()):
+    """Patch a cached shop automaton after its dictionary was written to Mongo."""
+    if shop_id in _generations:
+        _generations[shop_id] += 1
+    normalizer = _normalizers.get(shop_id)
+    if normalizer is None:
+        return
+    if normalizer is GLOBAL_NORMALIZER:
+        # Shop had no terms of its own yet; load a dedicated one next time
+        _normalizers.pop(shop_id, None)
+        return
+    for term, canonical in (added or {}).items():
+        normalizer.set_term(term, canonical)
+    for term in removed:
+        normalizer.remove_term(term)
+
+
+def forget_shop(shop_id: str):
+    _generations.pop(shop_id, None)
+    _normalizers.pop(shop_id, None)
@@ -0,0 +1,262 @@
+"""
+Durable outbound WhatsApp queue.
+
+`send_whatsapp_reply` used to await the Twilio call inline, adding Twilio's
+latency to every webhook. Now it only inserts into the `outbound_messages`
+collection and returns; a pool of async workers (OUTBOUND_WORKERS) delivers
+in the background:
+
+- claims are atomic (`find_one_and_update`) with a lease, so a crashed
+  worker's message is picked up again once the lease expires
+- failures retry with exponential backoff and jitter, up to
+  OUTBOUND_MAX_ATTEMPTS; permanent errors and exhausted retries are
+  dead-lettered (status "dead")
+- each sender number has a token bucket (OUTBOUND_RATE_PER_SECOND,
+  OUTBOUND_BURST); a worker over the rate waits in memory with its claimed
+  message, so throttling never writes to Mongo or changes delivery order
+
+Delivery goes through a transport: Twilio when configured, otherwise a
+console mock. `MockTransport` records sends and can inject failures.
+"""
+import asyncio
+import os
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from pymongo import ReturnDocument
+from database.connection import get_db
+from services import twilio_client
+
+OUTBOUND_WORKERS = int(os.getenv("OUTBOUND_WORKERS", "4"))
+OUTBOUND_MAX_ATTEMPTS = int(os.getenv("OUTBOUND_MAX_ATTEMPTS", "6"))
+OUTBOUND_BACKOFF_SECONDS = float(os.getenv("OUTBOUND_BACKOFF_SECONDS", "2"))
+OUTBOUND_MAX_BACKOFF_SECONDS = float(os.getenv("OUTBOUND_MAX_BACKOFF_SECONDS", "300"))
+OUTBOUND_RATE_PER_SECOND = float(os.getenv("OUTBOUND_RATE_PER_SECOND", "10"))
+OUTBOUND_BURST = float(os.getenv("OUTBOUND_BURST", "20"))
+OUTBOUND_LEASE_SECONDS = 60
+POLL_SECONDS = 1.0
+
+
+# ── Transports ───────────────────────────────────────────────────────────────
+
+class TwilioTransport:
+    async def send(self, to: str, body: str, sender: Optional[str]) -> dict:
+        return await twilio_client.send_message(to, body, sender)
+
+
+class ConsoleTransport:
+    async def send(self, to: str, body: str, sender: Optional[str]) -> dict:
+        print(f"[WHATSAPP MOCK] To: {to}\nMessage: {body}")
+        return {"status": "mock_sent"}
+
+
+class MockTransport:
+    """Records every send; the first `fail_times` sends raise."""
+
+    def __init__(self, fail_times: int = 0, error: Exception = None):
+        self.sent: List[dict] = []
+        self.fail_times = fail_times
+        self.error = error or ConnectionError("mock transport failure")
+
+    async def send(self, to: str, body: str, sender: Optional[str]) -> dict:
+        if self.fail_times > 0:
+            self.fail_times -= 1
+            raise self.error
+        self.sent.append({"to": to, "body": body, "sender": sender})
+        return {"status": "mock_sent", "sid": f"MOCK{len(self.sent)}"}
+
+
+def default_transport():
+    return TwilioTransport() if twilio_client.configured() else ConsoleTransport()
+
+
+# ── Rate limiting ────────────────────────────────────────────────────────────
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def take(self) -> float:
+        """Take a token. Returns 0 on success, else seconds until one is free."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+# ── Queue ────────────────────────────────────────────────────────────────────
+
+class OutboundQueue:
+    def __init__(self, transport=None, workers: int = OUTBOUND_WORKERS):
+        self.transport = transport or default_transport()
+        self.worker_count = workers
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._wake = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+        self._stopping = False
+        self.sent = 0
+        self.retried = 0
+        self.dead = 0
+        self.throttled = 0
+
+    async def enqueue(self, to: str, body: str, sender: Optional[str] = None) -> dict:
+        db = get_db()
+        now = datetime.utcnow()
+        result = await db.outbound_messages.insert_one({
+            "to": to,
+            "body": body,
+            "sender": sender,
+            "status": "queued",
+            "attempts": 0,
+            "next_attempt_at": now,
+            "created_at": now,
+        })
+        self._wake.set()
+        return {"status": "queued", "id": str(result.inserted_id)}
+
+    async def _claim(self) -> Optional[dict]:
+        db = get_db()
+        now = datetime.utcnow()
+        return await db.outbound_messages.find_one_and_update(
+            {"$or": [
+                {"status": "queued", "next_attempt_at": {"$lte": now}},
+                {"status": "sending", "lease_until": {"$lt": now}},
+            ]},
+            {"$set": {"status": "sending", "lease_until": now + timedelta(seconds=OUTBOUND_LEASE_SECONDS)}},
+            sort=[("next_attempt_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    def _bucket(self, sender: Optional[str]) -> TokenBucket:
+        key = sender or twilio_client.TWILIO_WHATSAPP
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(OUTBOUND_RATE_PER_SECOND, OUTBOUND_BURST)
+        return bucket
+
+    def _wake_in(self, seconds: float):
+        asyncio.get_running_loop().call_later(seconds, self._wake.set)
+
+    def backoff(self, attempts: int) -> float:
+        delay = min(OUTBOUND_MAX_BACKOFF_SECONDS, OUTBOUND_BACKOFF_SECONDS * 2 ** (attempts - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    async def _throttle(self, msg: dict):
+        """Wait in memory until the sender's bucket has a token (no write, order kept)."""
+        bucket = self._bucket(msg.get("sender"))
+        # asyncio.Lock is FIFO: workers get tokens in the order they claimed
+        async with bucket.lock:
+            wait = bucket.take()
+            if wait:
+                self.throttled += 1
+            while wait:
+                await asyncio.sleep(wait)
+                wait = bucket.take()
+
+    async def _deliver(self, msg: dict):
+        db = get_db()
+        attempts = msg["attempts"] + 1
+        try:
+            result = await self.transport.send(msg["to"], msg["body"], msg.get("sender"))
+        except Exception as e:
+            retryable = getattr(e, "retryable", True)
+            if not retryable or attempts >= OUTBOUND_MAX_ATTEMPTS:
+                self.dead += 1
+                update = {"status": "dead", "failed_at": datetime.utcnow()}
+            else:
+                self.retried += 1
+                delay = self.backoff(attempts)
+                update = {"status": "queued", "next_attempt_at": datetime.utcnow() + timedelta(seconds=delay)}
+                self._wake_in(delay)
+            await db.outbound_messages.update_one(
+                {"_id": msg["_id"]},
+                {"$set": {**update, "attempts": attempts, "last_error": str(e)[:500]}},
+            )
+            return
+
+        self.sent += 1
+        await db.outbound_messages.update_one(
+            {"_id": msg["_id"]},
+            {"$set": {"status": "sent", "attempts": attempts, "sent_at": datetime.utcnow(), "result": result}},
+        )
+
+    async def _worker(self):
+        while not self._stopping:
+            try:
+                msg = await self._claim()
+            except Exception as e:
+                print(f"Outbound queue claim failed: {e}")
+                msg = None
+            if msg is None:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                # The claim's lease covers the wait: a worker holds one message,
+                # so it waits at most OUTBOUND_WORKERS / OUTBOUND_RATE_PER_SECOND
+                await self._throttle(msg)
+                await self._deliver(msg)
+            except Exception as e:
+                # The lease expires and another worker retries the message
+                print(f"Outbound delivery bookkeeping failed: {e}")
+
+    def start(self):
+        if self._tasks:
+            return
+        self._stopping = False
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+
+    async def stop(self, timeout: float = 10):
+        """Stop claiming new messages and let in-flight sends finish."""
+        self._stopping = True
+        self._wake.set()
+        if self._tasks:
+            done, pending = await asyncio.wait(self._tasks, timeout=timeout)
+            for task in pending:
+                task.cancel()
+        self._tasks = []
+
+    async def stats(self) -> dict:
+        db = get_db()
+        depth = await db.outbound_messages.count_documents({"status": "queued"})
+        # Lag: how overdue the next due message is (scheduled retries don't count)
+        head = await db.outbound_messages.find_one(
+            {"status": "queued"}, {"next_attempt_at": 1}, sort=[("next_attempt_at", 1)]
+        )
+        dead = await db.outbound_messages.count_documents({"status": "dead"})
+        lag = max(0.0, (datetime.utcnow() - head["next_attempt_at"]).total_seconds()) if head else 0
+        return {
+            "workers": len(self._tasks),
+            "transport": type(self.transport).__name__,
+            "depth": depth,
+            "lag_seconds": round(lag, 1),
+            "dead_letters": dead,
+            "sent": self.sent,
+            "retried": self.retried,
+            "dead": self.dead,
+            "throttled": self.throttled,
+        }
+
+
+queue = OutboundQueue()
+
+
+def set_transport(transport):
+    """Swap the delivery transport, e.g. MockTransport in tests."""
+    queue.transport = transport
+
+
+async def enqueue(to: str, body: str, sender: Optional[str] = None) -> dict:
+    return await queue.enqueue(to, body, sender)
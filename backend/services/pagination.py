@@ -0,0 +1,86 @@
+"""
+Keyset (cursor) pagination helpers for list endpoints.
+
+`skip`-style paging makes page N cost N pages of index scanning. A keyset
+cursor instead remembers the sort key of the last row returned, `(value, _id)`,
+and the next page starts right after it, so every page is one index seek
+whatever its depth. The cursor is an opaque URL-safe token; clients send back
+what they received in the `X-Next-Cursor` header.
+
+`etag` builds a weak validator from a collection version plus the request
+parameters, so an unchanged list can be answered with `304 Not Modified`.
+"""
+import base64
+import hashlib
+import json
+import re
+from datetime import datetime
+from typing import Optional, Tuple
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+ETAG_HEADER = "ETag"
+FIELD_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_.]*$")
+
+
+def encode_cursor(value, doc_id) -> str:
+    if isinstance(value, datetime):
+        payload = {"t": "dt", "v": value.isoformat()}
+    else:
+        payload = {"v": value}
+    payload["id"] = str(doc_id)
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> Tuple[object, ObjectId]:
+    """Raises ValueError for anything that is not a cursor we issued."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        payload = json.loads(raw)
+        value = payload["v"]
+        if payload.get("t") == "dt":
+            value = datetime.fromisoformat(value)
+        return value, ObjectId(payload["id"])
+    except (ValueError, KeyError, TypeError, InvalidId):
+        raise ValueError("Invalid cursor")
+
+
+def after(field: str, token: Optional[str], descending: bool = True) -> dict:
+    """Query clause selecting rows strictly after the cursor in (field, _id) order."""
+    if not token:
+        return {}
+    value, doc_id = decode_cursor(token)
+    op = "$lt" if descending else "$gt"
+    return {"$or": [
+        {field: {op: value}},
+        {field: value, "_id": {op: doc_id}},
+    ]}
+
+
+def projection(fields: Optional[str], always=()) -> Optional[dict]:
+    """Turn `fields=a,b,c` into a Mongo projection; None means every field."""
+    if not fields:
+        return None
+    names = [f.strip() for f in fields.split(",") if f.strip()]
+    bad = [f for f in names if not FIELD_RE.match(f)]
+    if bad:
+        raise ValueError(f"Invalid field name(s): {', '.join(bad)}")
+    return {name: 1 for name in [*names, *always]}
+
+
+def etag(*parts) -> str:
+    digest = hashlib.sha1("|".join(str(p) for p in parts).encode()).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def not_modified(if_none_match: Optional[str], tag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison: W/"x" and "x" are the same validator
+    sent = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+    return tag.removeprefix("W/") in sent
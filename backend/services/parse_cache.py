@@ -0,0 +1,82 @@
+"""
+Two-tier cache for LLM parse results.
+
+Repeat customers send the same short messages ("doodh 2", "ek bread") all day,
+and each rule-parser miss used to cost a full Gemini call. Results are cached
+by normalized message text:
+
+- tier 1: an in-process LRU (PARSE_CACHE_SIZE entries)
+- tier 2: the `llm_parse_cache` collection, expired by a TTL index
+  (PARSE_CACHE_TTL_SECONDS)
+
+LLM parsing does not depend on the shop, so one entry serves every shop.
+"""
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from database.connection import get_db, PARSE_CACHE_TTL_SECONDS
+
+PARSE_CACHE_SIZE = int(os.getenv("PARSE_CACHE_SIZE", "5000"))
+
+_local: "OrderedDict[str, tuple]" = OrderedDict()
+STATS = {"local_hits": 0, "db_hits": 0, "misses": 0}
+
+
+def _remember(key: str, value: dict, stored_at: float):
+    _local[key] = (stored_at, value)
+    _local.move_to_end(key)
+    while len(_local) > PARSE_CACHE_SIZE:
+        _local.popitem(last=False)
+
+
+async def get(key: str) -> Optional[dict]:
+    entry = _local.get(key)
+    if entry and time.time() - entry[0] < PARSE_CACHE_TTL_SECONDS:
+        _local.move_to_end(key)
+        STATS["local_hits"] += 1
+        return entry[1]
+    _local.pop(key, None)
+
+    db = get_db()
+    doc = await db.llm_parse_cache.find_one({
+        "_id": key,
+        "created_at": {"$gt": datetime.utcnow() - timedelta(seconds=PARSE_CACHE_TTL_SECONDS)},
+    })
+    if not doc:
+        STATS["misses"] += 1
+        return None
+
+    STATS["db_hits"] += 1
+    value = {"items": doc["items"], "reply": doc.get("reply")}
+    _remember(key, value, doc["created_at"].replace(tzinfo=timezone.utc).timestamp())
+    return value
+
+
+async def put(key: str, value: dict):
+    _remember(key, value, time.time())
+    db = get_db()
+    await db.llm_parse_cache.update_one(
+        {"_id": key},
+        {"$set": {"items": value["items"], "reply": value.get("reply"), "created_at": datetime.utcnow()}},
+        upsert=True,
+    )
+
+
+async def purge() -> dict:
+    local = len(_local)
+    _local.clear()
+    db = get_db()
+    result = await db.llm_parse_cache.delete_many({})
+    return {"local_purged": local, "db_purged": result.deleted_count}
+
+
+def stats() -> dict:
+    lookups = STATS["local_hits"] + STATS["db_hits"] + STATS["misses"]
+    hits = STATS["local_hits"] + STATS["db_hits"]
+    return {
+        **STATS,
+        "local_entries": len(_local),
+        "hit_rate": round(hits / lookups, 3) if lookups else 0,
+    }
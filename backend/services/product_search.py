@@ -0,0 +1,121 @@
+"""
+Indexed product search over name, brand and barcode.
+
+Each product carries `search_grams`, kept current on create / update / import
+and indexed together with `shop_id` (multikey). For every word of its name,
+brand and barcode it holds the edge-grams (prefixes of MIN_GRAM to MAX_GRAM
+characters) and the trigrams (every 3-character substring):
+
+- a 2-character query word matches the start of a word, through its edge-gram
+- a longer query word matches anywhere inside a word ("ilk" finds "Milk"):
+  the index narrows candidates to products holding all of its trigrams, and a
+  regex check on name / brand / barcode drops trigram false positives
+
+Ranking runs in the database: every match gets a rank (exact name, barcode,
+name prefix, word prefixes in the name, substring of the name, brand or
+barcode only), sorted and paged in one aggregation that also returns the exact
+total, so a common prefix on a large catalog never truncates results.
+"""
+import re
+from typing import List, Optional
+
+from database.connection import get_db
+
+MIN_GRAM = 2
+MAX_GRAM = 12
+NGRAM = 3
+SEARCH_FIELDS = {
+    "name": 1, "price": 1, "stock": 1, "unit": 1, "active": 1, "is_low": 1,
+    "attributes.brand": 1, "attributes.barcode": 1,
+}
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+# Internal field, left out of product API responses
+HIDDEN_FIELDS = {"search_grams": 0}
+MATCH_FIELDS = ("name", "attributes.brand", "attributes.barcode")
+
+
+def words(text) -> List[str]:
+    return WORD_RE.findall(str(text or "").lower())
+
+
+def word_grams(word: str) -> set:
+    out = {word[:n] for n in range(MIN_GRAM, min(len(word), MAX_GRAM) + 1)}
+    out.update(word[i:i + NGRAM] for i in range(len(word) - NGRAM + 1))
+    return out
+
+
+def grams(name: str, attributes: Optional[dict] = None) -> List[str]:
+    attributes = attributes or {}
+    out = set()
+    for word in words(name) + words(attributes.get("brand")) + words(attributes.get("barcode")):
+        out |= word_grams(word)
+    return sorted(out)
+
+
+def query_tokens(q: str) -> List[str]:
+    return [t for t in words(q) if len(t) >= MIN_GRAM]
+
+
+def query_grams(tokens: List[str]) -> List[str]:
+    """Index keys every match must hold: the edge-gram of short words, trigrams of the rest."""
+    keys = []
+    for token in tokens:
+        if len(token) < NGRAM:
+            keys.append(token)
+        else:
+            keys.extend(token[i:i + NGRAM] for i in range(len(token) - NGRAM + 1))
+    return list(dict.fromkeys(keys))
+
+
+def _contains(field: str, pattern: str) -> dict:
+    return {"$regexMatch": {"input": {"$ifNull": [f"${field}", ""]}, "regex": pattern, "options": "i"}}
+
+
+def _token_pattern(token: str) -> str:
+    # Short words only match at a word start, like their edge-gram
+    return re.escape(token) if len(token) >= NGRAM else r"(^|\W)" + re.escape(token)
+
+
+def rank_stage(q: str, tokens: List[str]) -> dict:
+    """$set of `_rank`, higher is better."""
+    barcode = {"$toLower": {"$ifNull": ["$attributes.barcode", ""]}}
+    tiers = [
+        (100, {"$eq": [{"$toLower": "$name"}, q]}),
+        (90, {"$eq": [barcode, q]}),
+        (80, _contains("name", "^" + re.escape(q))),
+        (60, {"$and": [_contains("name", r"(^|\W)" + re.escape(t)) for t in tokens]}),
+        (50, {"$and": [_contains("name", _token_pattern(t)) for t in tokens]}),
+    ]
+    return {"$set": {"_rank": {"$switch": {
+        "branches": [{"case": case, "then": rank} for rank, case in tiers],
+        "default": 40,
+    }}}}
+
+
+async def search(
+    shop_id: str, q: str, limit: int = 20, offset: int = 0, projection: Optional[dict] = None
+) -> dict:
+    tokens = query_tokens(q)
+    if not tokens:
+        return {"results": [], "total": 0, "has_more": False}
+    db = get_db()
+    q = " ".join(words(q))
+    match = {
+        "shop_id": shop_id,
+        "search_grams": {"$all": query_grams(tokens)},
+        # Every word must really occur in name, brand or barcode (trigrams can over-match)
+        "$and": [
+            {"$or": [{field: {"$regex": _token_pattern(t), "$options": "i"}} for field in MATCH_FIELDS]}
+            for t in tokens
+        ],
+    }
+    page = [{"$skip": offset}, {"$limit": limit}, {"$project": projection or SEARCH_FIELDS}]
+    found = await db.products.aggregate([
+        {"$match": match},
+        rank_stage(q, tokens),
+        {"$sort": {"_rank": -1, "name": 1, "_id": 1}},
+        {"$facet": {"results": page, "total": [{"$count": "n"}]}},
+    ]).to_list(1)
+    results = found[0]["results"] if found else []
+    total = found[0]["total"][0]["n"] if found and found[0]["total"] else 0
+    return {"results": results, "total": total, "has_more": offset + len(results) < total}
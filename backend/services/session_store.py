@@ -0,0 +1,72 @@
+"""
+WhatsApp order sessions: one document per (shop_id, customer_phone).
+
+A parsed message used to `delete_many` the customer's sessions and
+`insert_one` a new one, and CONFIRM did a sorted `find_one` then `update_one`,
+so two CONFIRMs arriving together could both place the order. Now:
+
+- `save_pending` writes the session with a single upsert
+- `claim` flips it pending -> confirming with `find_one_and_update`; only one
+  caller can win, the other sees no pending session
+- `complete` deletes the claimed session once the order exists, `release`
+  hands it back if placing the order failed
+
+Every write sets `expires_at`, and a TTL index removes sessions nobody
+confirmed within WHATSAPP_SESSION_TTL_SECONDS.
+"""
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from database.connection import get_db, WHATSAPP_SESSION_TTL_SECONDS
+
+
+async def save_pending(
+    shop_id: str,
+    customer_phone: str,
+    raw_message: str,
+    parsed_items: List[dict],
+    confirmed_items: List[dict],
+    total: float,
+):
+    db = get_db()
+    now = datetime.utcnow()
+    key = {"shop_id": shop_id, "customer_phone": customer_phone}
+    update = {"$set": {
+        "raw_message": raw_message,
+        "parsed_items": parsed_items,
+        "confirmed_items": confirmed_items,
+        "total": total,
+        "status": "pending",
+        "created_at": now,
+        "expires_at": now + timedelta(seconds=WHATSAPP_SESSION_TTL_SECONDS),
+    }}
+    try:
+        await db.whatsapp_sessions.update_one(key, update, upsert=True)
+    except DuplicateKeyError:
+        # Lost an upsert race on the unique key; the document exists now
+        await db.whatsapp_sessions.update_one(key, update)
+
+
+async def claim(shop_id: str, customer_phone: str) -> Optional[dict]:
+    """Take the customer's pending session for confirming, or None if there is none."""
+    db = get_db()
+    return await db.whatsapp_sessions.find_one_and_update(
+        {"shop_id": shop_id, "customer_phone": customer_phone, "status": "pending"},
+        {"$set": {"status": "confirming", "claimed_at": datetime.utcnow()}},
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def complete(session: dict):
+    db = get_db()
+    await db.whatsapp_sessions.delete_one({"_id": session["_id"], "status": "confirming"})
+
+
+async def release(session: dict):
+    db = get_db()
+    await db.whatsapp_sessions.update_one(
+        {"_id": session["_id"], "status": "confirming"},
+        {"$set": {"status": "pending"}},
+    )
@@ -0,0 +1,87 @@
+"""
+In-process routing table: WhatsApp number -> shop summary.
+
+Each inbound message used to run `find_one({"whatsapp_number": to})` and, on
+a miss, a second `find_one({"phone": to})` (and `whatsapp_number` was not
+indexed). The table is warmed from `shops` at startup and kept current by the
+shop create / update / delete routes, so resolving a shop is a dict lookup.
+A number that is not in the table falls back to one indexed `$or` query.
+
+As before, a shop's `whatsapp_number` takes precedence over another shop's
+`phone`.
+"""
+from typing import Dict, Optional
+
+from database.connection import get_db
+
+SHOP_SUMMARY_FIELDS = {"name": 1, "shop_type": 1, "phone": 1, "whatsapp_number": 1}
+
+_by_whatsapp: Dict[str, dict] = {}
+_by_phone: Dict[str, dict] = {}
+_numbers: Dict[str, tuple] = {}  # shop id -> (whatsapp_number, phone) it is filed under
+STATS = {"hits": 0, "misses": 0}
+
+
+def _summary(doc: dict) -> dict:
+    return {
+        "id": str(doc["_id"]),
+        "name": doc.get("name", ""),
+        "shop_type": doc.get("shop_type"),
+        "phone": doc.get("phone") or "",
+        "whatsapp_number": doc.get("whatsapp_number") or "",
+    }
+
+
+def shop_deleted(shop_id: str):
+    whatsapp_number, phone = _numbers.pop(shop_id, ("", ""))
+    if _by_whatsapp.get(whatsapp_number, {}).get("id") == shop_id:
+        del _by_whatsapp[whatsapp_number]
+    if _by_phone.get(phone, {}).get("id") == shop_id:
+        del _by_phone[phone]
+
+
+def shop_saved(doc: dict) -> dict:
+    """File a created or updated shop document under its current numbers."""
+    summary = _summary(doc)
+    shop_deleted(summary["id"])
+    if summary["whatsapp_number"]:
+        _by_whatsapp[summary["whatsapp_number"]] = summary
+    if summary["phone"]:
+        _by_phone[summary["phone"]] = summary
+    _numbers[summary["id"]] = (summary["whatsapp_number"], summary["phone"])
+    return summary
+
+
+async def warm() -> int:
+    db = get_db()
+    _by_whatsapp.clear()
+    _by_phone.clear()
+    _numbers.clear()
+    count = 0
+    async for doc in db.shops.find({}, SHOP_SUMMARY_FIELDS):
+        shop_saved(doc)
+        count += 1
+    return count
+
+
+async def resolve(number: str) -> Optional[dict]:
+    if not number:
+        return None
+    summary = _by_whatsapp.get(number) or _by_phone.get(number)
+    if summary:
+        STATS["hits"] += 1
+        return summary
+
+    STATS["misses"] += 1
+    db = get_db()
+    docs = await db.shops.find(
+        {"$or": [{"whatsapp_number": number}, {"phone": number}]}, SHOP_SUMMARY_FIELDS
+    ).to_list(2)
+    if not docs:
+        return None
+    docs.sort(key=lambda d: d.get("whatsapp_number") != number)
+    return shop_saved(docs[0])
+
+
+def stats() -> dict:
+    return {**STATS, "shops": len(_numbers)}
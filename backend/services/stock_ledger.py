@@ -0,0 +1,56 @@
+"""
+Stock movement ledger.
+
+Every stock change made through adjust-stock or an order commit appends one
+compact document to `stock_movements`:
+
+    {shop_id, product_id, delta, reason, order_id?, stock_after?, created_at}
+
+Movements are written in bulk (one `insert_many` per request or order), and
+the (shop_id, product_id, created_at) index makes a product's history or a
+reconciliation over a date range a single indexed query.
+"""
+from datetime import datetime
+from typing import List, Optional
+
+from database.connection import get_db
+
+
+def movement(
+    shop_id: str,
+    product_id: str,
+    delta: int,
+    reason: str,
+    order_id: Optional[str] = None,
+    stock_after: Optional[int] = None,
+    at: Optional[datetime] = None,
+) -> dict:
+    doc = {
+        "shop_id": shop_id,
+        "product_id": product_id,
+        "delta": delta,
+        "reason": reason,
+        "created_at": at or datetime.utcnow(),
+    }
+    if order_id is not None:
+        doc["order_id"] = order_id
+    if stock_after is not None:
+        doc["stock_after"] = stock_after
+    return doc
+
+
+async def record(movements: List[dict], session=None):
+    if not movements:
+        return
+    db = get_db()
+    await db.stock_movements.insert_many(movements, ordered=False, session=session)
+
+
+async def history(shop_id: str, product_id: str, limit: int = 100) -> List[dict]:
+    db = get_db()
+    return await (
+        db.stock_movements.find({"shop_id": shop_id, "product_id": product_id}, {"_id": 0, "shop_id": 0})
+        .sort("created_at", -1)
+        .limit(limit)
+        .to_list(limit)
+    )
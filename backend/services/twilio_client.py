@@ -0,0 +1,117 @@
+"""
+Shared, long-lived HTTP client for Twilio sends.
+
+Opening an `httpx.AsyncClient` per reply meant a fresh TCP + TLS handshake to
+api.twilio.com on every message. One client is created in `main.lifespan`
+and reused: keep-alive connections, bounded pool, explicit timeouts and
+optional HTTP/2 (TWILIO_HTTP2=1, needs the `h2` package).
+
+TWILIO_API_BASE points the client at a local stand-in server for testing
+(see benchmarks/bench_twilio.py).
+"""
+import os
+import time
+from typing import Optional
+
+import httpx
+
+TWILIO_SID = os.getenv("TWILIO_ACCOUNT_SID", "")
+TWILIO_TOKEN = os.getenv("TWILIO_AUTH_TOKEN", "")
+TWILIO_WHATSAPP = os.getenv("TWILIO_WHATSAPP_NUMBER", "whatsapp:+14155238886")
+TWILIO_API_BASE = os.getenv("TWILIO_API_BASE", "https://api.twilio.com")
+TWILIO_HTTP2 = os.getenv("TWILIO_HTTP2", "0") == "1"
+TWILIO_MAX_CONNECTIONS = int(os.getenv("TWILIO_MAX_CONNECTIONS", "20"))
+TWILIO_CONNECT_TIMEOUT = float(os.getenv("TWILIO_CONNECT_TIMEOUT", "5"))
+TWILIO_READ_TIMEOUT = float(os.getenv("TWILIO_READ_TIMEOUT", "10"))
+
+client: Optional[httpx.AsyncClient] = None
+STATS = {"sends": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0}
+
+
+class TwilioSendError(Exception):
+    """Twilio rejected a send. `retryable` is False for permanent 4xx errors."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(f"Twilio returned {status_code}: {detail}")
+        self.status_code = status_code
+        self.retryable = status_code == 429 or status_code >= 500
+
+
+def configured() -> bool:
+    return bool(TWILIO_SID and TWILIO_TOKEN)
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+async def start(base_url: str = TWILIO_API_BASE):
+    global client
+    if client is not None:
+        return
+    http2 = TWILIO_HTTP2 and _http2_available()
+    if TWILIO_HTTP2 and not http2:
+        print("TWILIO_HTTP2=1 but the h2 package is missing; using HTTP/1.1")
+    client = httpx.AsyncClient(
+        base_url=base_url,
+        auth=(TWILIO_SID, TWILIO_TOKEN),
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=TWILIO_MAX_CONNECTIONS,
+            max_keepalive_connections=TWILIO_MAX_CONNECTIONS,
+            keepalive_expiry=60,
+        ),
+        timeout=httpx.Timeout(
+            TWILIO_READ_TIMEOUT,
+            connect=TWILIO_CONNECT_TIMEOUT,
+            pool=TWILIO_CONNECT_TIMEOUT,
+        ),
+    )
+
+
+async def close():
+    global client
+    if client is not None:
+        await client.aclose()
+        client = None
+
+
+async def send_message(to: str, body: str, sender: Optional[str] = None) -> dict:
+    """POST one WhatsApp message through the shared client."""
+    if client is None:
+        await start()
+    data = {
+        "From": sender or TWILIO_WHATSAPP,
+        "To": f"whatsapp:{to}",
+        "Body": body,
+    }
+    start_time = time.perf_counter()
+    try:
+        response = await client.post(f"/2010-04-01/Accounts/{TWILIO_SID}/Messages.json", data=data)
+        if response.status_code >= 400:
+            raise TwilioSendError(response.status_code, response.text[:200])
+        return response.json()
+    except Exception:
+        STATS["errors"] += 1
+        raise
+    finally:
+        elapsed = (time.perf_counter() - start_time) * 1000
+        STATS["sends"] += 1
+        STATS["total_ms"] += elapsed
+        STATS["max_ms"] = max(STATS["max_ms"], elapsed)
+
+
+def stats() -> dict:
+    sends = STATS["sends"]
+    return {
+        "configured": configured(),
+        "base_url": TWILIO_API_BASE,
+        "sends": sends,
+        "errors": STATS["errors"],
+        "avg_latency_ms": round(STATS["total_ms"] / sends, 1) if sends else 0,
+        "max_latency_ms": round(STATS["max_ms"], 1),
+    }